@@ -0,0 +1,174 @@
+'''
+Offline analysis of many positions: positions are streamed from a file, searched on a process pool
+and results are written as JSON Lines in the order they complete.
+
+Input file, one position per line (blank lines and lines starting with # are skipped):
+    <FEN>                                   position given directly
+    <FEN> moves e2e4 e7e5                   FEN followed by moves in long algebraic notation
+    startpos moves e2e4 e7e5 g1f3           moves from the initial position (UCI style)
+    fen <FEN> moves e2e4                    UCI style FEN
+    e2e4 e7e5 g1f3                          plain move list from the initial position
+
+Output, one JSON object per position:
+    {"id": <line number>, "fen": ..., "best_move": "g1f3", "score": 35, "pv": [...], "nodes": ..., "time": ...}
+    with --stats also "stats": {...}       search statistics (see SearchStats.to_dict)
+    {"id": <line number>, "error": "..."}   for lines that can't be parsed or analyzed
+Scores are centipawns from the point of view of the side to move.
+
+Usage:
+    python BatchAnalysis.py positions.txt --depth 4 --workers 8 --output results.jsonl
+    python BatchAnalysis.py positions.txt --time 0.5 > results.jsonl
+    python BatchAnalysis.py positions.txt --depth 5 --stats           # include search statistics
+'''
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Iterator
+import ChessAI
+from ChessEngine import GameState, START_FEN
+
+DEFAULT_DEPTH = 4
+
+_searcher = None # one per process, its tables are reused (aged) from position to position
+
+
+def parse_position(line: str) -> GameState:
+    '''GameState for one input line (see module docstring for formats), raises ValueError for invalid lines'''
+
+    fields = line.split()
+    if fields[0] == 'startpos':
+        fen = START_FEN
+        rest = fields[1:]
+    elif fields[0] == 'fen':
+        fen = ' '.join(fields[1:fields.index('moves')] if 'moves' in fields else fields[1:])
+        rest = fields[fields.index('moves'):] if 'moves' in fields else []
+    elif '/' in fields[0]:
+        end = fields.index('moves') if 'moves' in fields else len(fields)
+        fen = ' '.join(fields[:end])
+        rest = fields[end:]
+    else:
+        fen = START_FEN
+        rest = ['moves'] + fields
+    if rest and rest[0] != 'moves':
+        raise ValueError(f'Expected "moves", got {rest[0]!r}')
+
+    return GameState.from_moves(fen, rest[1:])
+
+def analyze_position(line_number: int, line: str, depth: int = DEFAULT_DEPTH, time_limit: float = None, node_limit: int = None,
+                     with_stats: bool = False) -> dict:
+    '''
+    Search one input line and return its result record, an error record if it can't be parsed or analyzed.
+    Runs in pool workers, where the transposition table and move ordering tables are reused (aged) from position to position
+    '''
+
+    global _searcher
+
+    start_time = time.perf_counter()
+    try:
+        gs = parse_position(line)
+    except ValueError as error:
+        return {'id': line_number, 'error': str(error)}
+
+    try:
+        valid_moves = gs.get_valid_moves()
+        result = {'id': line_number, 'fen': gs.to_fen()}
+        if not valid_moves:
+            result.update({'best_move': None, 'score': -ChessAI.CHECKMATE if gs.checkmate else ChessAI.STALEMATE,
+                           'pv': [], 'nodes': 0, 'time': time.perf_counter() - start_time})
+            return result
+
+        if _searcher is None:
+            _searcher = ChessAI.Searcher()
+        searcher = _searcher
+        searcher.new_search()
+        score = searcher.find_move_iterative_deepening(gs, valid_moves, depth, time_limit, node_limit)
+        best_move = searcher.best_moves[0] # deterministic pick, the first of equally scored moves
+        result.update({'best_move': best_move.get_uci_notation(),
+                       'score': score,
+                       'pv': [move.get_uci_notation() for move in searcher.principal_variation],
+                       'nodes': searcher.counter,
+                       'time': time.perf_counter() - start_time})
+        if with_stats:
+            result['stats'] = searcher.get_search_stats().to_dict()
+    except Exception as error: # one bad position must not end the whole batch
+        return {'id': line_number, 'error': f'analysis failed: {type(error).__name__}: {error}'}
+    return result
+
+def read_lines(path: str) -> Iterator[tuple[int, str]]:
+    '''(line number, line) of every position line in the file, read lazily ('-' reads stdin)'''
+
+    file = sys.stdin if path == '-' else open(path, buffering=1 << 20)
+    try:
+        for line_number, line in enumerate(file, 1):
+            line = line.strip()
+            if line and line[0] != '#':
+                yield line_number, line
+    finally:
+        if file is not sys.stdin:
+            file.close()
+
+def analyze_positions(lines, depth: int = DEFAULT_DEPTH, time_limit: float = None, node_limit: int = None,
+                      workers: int = None, max_pending: int = None, with_stats: bool = False) -> Iterator[dict]:
+    '''
+    Search (line number, line) pairs on a process pool and yield result records as they complete.
+    At most max_pending positions (default 4 per worker) are in flight, so input is only read as fast as
+    results come back and memory stays flat however long the input is
+    '''
+
+    workers = workers or os.cpu_count() or 1
+    max_pending = max_pending or workers * 4
+    with ProcessPoolExecutor(workers) as executor:
+        pending = set()
+        for line_number, line in lines:
+            if len(pending) >= max_pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+            pending.add(executor.submit(analyze_position, line_number, line, depth, time_limit, node_limit, with_stats))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+
+def run_batch(input_path: str, output, depth: int = DEFAULT_DEPTH, time_limit: float = None, node_limit: int = None, workers: int = None,
+              with_stats: bool = False) -> dict:
+    '''Analyze every position of the input file, write JSON Lines to output (file object), return summary counts'''
+
+    start_time = time.perf_counter()
+    positions = errors = nodes = 0
+    for result in analyze_positions(read_lines(input_path), depth, time_limit, node_limit, workers, with_stats=with_stats):
+        output.write(json.dumps(result) + '\n')
+        output.flush()
+        positions += 1
+        if 'error' in result:
+            errors += 1
+        else:
+            nodes += result['nodes']
+    elapsed = time.perf_counter() - start_time
+    return {'positions': positions, 'errors': errors, 'nodes': nodes, 'time': elapsed,
+            'positions_per_second': positions / elapsed if elapsed else 0.0, 'nps': int(nodes / elapsed) if elapsed else 0}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Analyze positions from a file, write results as JSON Lines')
+    parser.add_argument('input', help="file with one position per line, '-' for stdin")
+    parser.add_argument('--output', '-o', default='-', help="results file, '-' for stdout (default)")
+    parser.add_argument('--depth', type=int, default=None, help=f'search depth (default {DEFAULT_DEPTH}, or unlimited with --time/--nodes)')
+    parser.add_argument('--time', type=float, default=None, help='time limit per position in seconds')
+    parser.add_argument('--nodes', type=int, default=None, help='node limit per position')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: CPU count)')
+    parser.add_argument('--stats', action='store_true', help='add search statistics to every result')
+    args = parser.parse_args()
+
+    depth = args.depth if args.depth is not None else (ChessAI.MAX_DEPTH if args.time or args.nodes else DEFAULT_DEPTH)
+    output = sys.stdout if args.output == '-' else open(args.output, 'w')
+    try:
+        summary = run_batch(args.input, output, depth, args.time, args.nodes, args.workers, args.stats)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print(f"{summary['positions']} positions ({summary['errors']} errors) in {summary['time']:.2f}s, "
+          f"{summary['positions_per_second']:.1f} positions/s, {summary['nps']} nps", file=sys.stderr)
@@ -0,0 +1,136 @@
+'''
+Precomputed bitboard tables and attack helpers used by GameState.
+
+Squares are indexed the same way as GameState.board is laid out: index = row * 8 + col,
+so bit 0 is a8 and bit 63 is h1.
+'''
+
+FULL_BOARD = (1 << 64) - 1
+SQUARES = tuple((r, c) for r in range(8) for c in range(8)) # square index -> (row, col)
+SQUARE_BB = tuple(1 << sq for sq in range(64)) # square index -> single bit bitboard
+
+FILE_A = sum(1 << (r * 8) for r in range(8))
+FILE_H = FILE_A << 7
+ROWS = tuple(0xFF << (r * 8) for r in range(8)) # ROWS[0] is the 8th rank, ROWS[7] is the 1st rank
+
+# move directions as (row step, col step), rook directions first and bishop directions last
+DIRECTIONS = ((-1, 0), (0, 1), (1, 0), (0, -1), (-1, -1), (-1, 1), (1, 1), (1, -1)) # opposite directions differ in bit 1
+ROOK_DIRECTIONS = (0, 1, 2, 3)
+BISHOP_DIRECTIONS = (4, 5, 6, 7)
+POSITIVE_DIRECTIONS = tuple(dr * 8 + dc > 0 for dr, dc in DIRECTIONS) # rays going towards higher square indices
+KNIGHT_VECTORS = ((-1, -2), (-1, 2), (1, -2), (1, 2), (-2, -1), (-2, 1), (2, -1), (2, 1))
+
+
+def square_index(square: tuple[int, int]) -> int:
+    '''Convert (row, col) board coordinates to a bitboard square index'''
+
+    return square[0] * 8 + square[1]
+
+def bit_squares(bb: int) -> list[int]:
+    '''Return indices of all set bits in the bitboard, lowest first'''
+
+    squares = []
+    while bb:
+        lsb = bb & -bb
+        squares.append(lsb.bit_length() - 1)
+        bb ^= lsb
+    return squares
+
+def _on_board(r: int, c: int) -> bool:
+    return 0 <= r < 8 and 0 <= c < 8
+
+def _leaper_attacks(vectors) -> tuple[int, ...]:
+    '''Attack table for pieces jumping by fixed vectors (knight, king)'''
+
+    table = []
+    for r, c in SQUARES:
+        attacks = 0
+        for dr, dc in vectors:
+            if _on_board(r + dr, c + dc):
+                attacks |= 1 << ((r + dr) * 8 + c + dc)
+        table.append(attacks)
+    return tuple(table)
+
+def _ray_squares(sq: int, direction: int) -> list[int]:
+    '''Squares walked from sq (exclusive) in the direction until the edge of the board'''
+
+    dr, dc = DIRECTIONS[direction]
+    r, c = SQUARES[sq]
+    squares = []
+    r, c = r + dr, c + dc
+    while _on_board(r, c):
+        squares.append(r * 8 + c)
+        r, c = r + dr, c + dc
+    return squares
+
+
+KNIGHT_ATTACKS = _leaper_attacks(KNIGHT_VECTORS)
+KING_ATTACKS = _leaper_attacks(DIRECTIONS)
+PAWN_ATTACKS = {'w': _leaper_attacks(((-1, -1), (-1, 1))), # squares attacked by a white pawn standing on the square
+                'b': _leaper_attacks(((1, -1), (1, 1)))}   # squares attacked by a black pawn standing on the square
+
+_RAY_SQUARES = tuple(tuple(_ray_squares(sq, d) for sq in range(64)) for d in range(len(DIRECTIONS))) # walked once, reused below
+RAYS = tuple(tuple(sum(1 << s for s in _RAY_SQUARES[d][sq]) for sq in range(64)) for d in range(len(DIRECTIONS)))
+
+# relevant occupancy for sliders: rays without their last square, as the edge square never blocks anything behind it
+ROOK_MASKS = tuple(sum(1 << s for d in ROOK_DIRECTIONS for s in _RAY_SQUARES[d][sq][:-1]) for sq in range(64))
+BISHOP_MASKS = tuple(sum(1 << s for d in BISHOP_DIRECTIONS for s in _RAY_SQUARES[d][sq][:-1]) for sq in range(64))
+
+# BETWEEN[a][b] - squares strictly between two aligned squares, LINE[a][b] - whole line through them (0 if not aligned)
+BETWEEN = [[0] * 64 for _ in range(64)]
+LINE = [[0] * 64 for _ in range(64)]
+for _sq in range(64):
+    for _d in range(len(DIRECTIONS)):
+        _between = 0
+        _line = RAYS[_d][_sq] | RAYS[_d ^ 2][_sq] | (1 << _sq) # _d ^ 2 is the opposite direction
+        for _s in _RAY_SQUARES[_d][_sq]:
+            BETWEEN[_sq][_s] = _between
+            LINE[_sq][_s] = _line
+            _between |= 1 << _s
+del _sq, _d, _between, _line, _s
+
+# slider attack tables keyed by masked occupancy, filled on first use of every occupancy pattern
+ROOK_TABLES = tuple({} for _ in range(64))
+BISHOP_TABLES = tuple({} for _ in range(64))
+
+
+def _slide(sq: int, occupied: int, directions: tuple[int, ...]) -> int:
+    '''Slider attacks walking rays until the first blocker (blocker square included)'''
+
+    attacks = 0
+    for d in directions:
+        ray = RAYS[d][sq]
+        blockers = ray & occupied
+        if blockers:
+            if POSITIVE_DIRECTIONS[d]:
+                blocker = (blockers & -blockers).bit_length() - 1 # nearest blocker is the lowest bit
+            else:
+                blocker = blockers.bit_length() - 1 # nearest blocker is the highest bit
+            ray ^= RAYS[d][blocker] # cut off everything behind the blocker
+        attacks |= ray
+    return attacks
+
+def rook_attacks(sq: int, occupied: int) -> int:
+    '''Squares attacked by a rook on sq for given occupancy'''
+
+    key = occupied & ROOK_MASKS[sq]
+    table = ROOK_TABLES[sq]
+    attacks = table.get(key)
+    if attacks is None:
+        attacks = table[key] = _slide(sq, key, ROOK_DIRECTIONS)
+    return attacks
+
+def bishop_attacks(sq: int, occupied: int) -> int:
+    '''Squares attacked by a bishop on sq for given occupancy'''
+
+    key = occupied & BISHOP_MASKS[sq]
+    table = BISHOP_TABLES[sq]
+    attacks = table.get(key)
+    if attacks is None:
+        attacks = table[key] = _slide(sq, key, BISHOP_DIRECTIONS)
+    return attacks
+
+def queen_attacks(sq: int, occupied: int) -> int:
+    '''Squares attacked by a queen on sq for given occupancy'''
+
+    return rook_attacks(sq, occupied) | bishop_attacks(sq, occupied)
@@ -1,45 +1,71 @@
-import copy
 import random
+import threading
+import time
 from ChessEngine import GameState, Move
+from TranspositionTable import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+from MoveOrdering import MoveOrderer
+from PieceSquareTables import PIECE_VALUES
+from SearchStats import SearchStats
 
 
-piece_value = {'K': 0,
-               'Q': 9,
-               'R': 5,
-               'B': 3,
-               'N': 3,
-               'P': 1}
+piece_value = PIECE_VALUES # centipawns
 
-CHECKMATE = 1000
+CHECKMATE = 100000 # the alpha-beta search scores a mate ply half moves from the root as CHECKMATE - ply
+MATE_THRESHOLD = CHECKMATE - 1000 # scores further from zero than this are mates
 STALEMATE = 0
 DEPTH = 3
+MAX_DEPTH = 30 # depth cap for iterative deepening
+TIME_LIMIT = 5 # seconds per move for iterative deepening
+TT_SIZE_MB = 16 # memory budget of the transposition table
+DELTA_MARGIN = 200 # quiescence skips captures that can't raise alpha even with this much extra material
 
+_shared_tables = {} # size in MB -> process-wide transposition table, see get_shared_table
+_shared_tables_lock = threading.Lock()
 
-def find_best_move(function, queue, **kwargs) -> Move:
-    ''' Helper function to call other specified functions based on chosen algorithm'''
-    global best_moves, counter
+
+class SearchTimeout(Exception):
+    '''Raised inside the search when its time or node budget runs out'''
+
+
+def get_shared_table(size_mb: float = TT_SIZE_MB) -> TranspositionTable:
+    '''
+    Process-wide transposition table of the given size, for searchers that should share what they learn (several games of one process).
+    Concurrent searches may interleave writes to one entry, which can only cost a score: hash moves are checked for legality before use
+    '''
     
-    gs = kwargs['gs']
+    with _shared_tables_lock:
+        if size_mb not in _shared_tables:
+            _shared_tables[size_mb] = TranspositionTable(size_mb)
+        return _shared_tables[size_mb]
+
+def get_mate_moves(score: int) -> int:
+    '''Moves until mate of a mate score, negative if the side to move gets mated, None for other scores'''
     
-    best_moves = []
-    temp_undo_log = copy.deepcopy(gs.undo_log)
-    counter = 0
-    function(**kwargs)
-    # print('Board states evaluated:', counter)
-    gs.undo_log = temp_undo_log
-    queue.put(best_moves[random.randint(0, len(best_moves) - 1)]) # add the ai move to return queue for the process
+    if abs(score) < MATE_THRESHOLD:
+        return None
+    moves = (CHECKMATE - abs(score) + 1) // 2
+    return moves if score > 0 else -moves
+
+def score_to_tt(score: int, ply: int) -> int:
+    '''Mate scores are stored as distance from the position instead of from the root, so entries hold at any ply'''
+    
+    if score >= MATE_THRESHOLD:
+        return score + ply
+    if score <= -MATE_THRESHOLD:
+        return score - ply
+    return score
+
+def score_from_tt(score: int, ply: int) -> int:
+    if score >= MATE_THRESHOLD:
+        return score - ply
+    if score <= -MATE_THRESHOLD:
+        return score + ply
+    return score
 
 def get_material_score(gs: GameState) -> int:
     '''Get material score for current board state. + for white pieces - for black pieces '''
     
-    score = 0
-    for row in gs.board:
-        for square in row:
-            if square[0] == 'w':
-                score += piece_value[square[1]]
-            elif square[0] == 'b':
-                score -= piece_value[square[1]]
-    return score
+    return gs.material['w'] - gs.material['b'] # kept up to date by GameState on every move
 
 def get_board_score(gs: GameState) -> int: 
     '''Assess current board state. + good for white, - good for black'''
@@ -49,210 +75,431 @@ def get_board_score(gs: GameState) -> int:
             return -CHECKMATE
         else:
             return CHECKMATE
-    elif gs.stalemate:
+    elif gs.draw_reason is not None: # stalemate, fifty-move rule or threefold repetition
         return STALEMATE
     
-    score = 0
-    for row in gs.board:
-        for square in row:
-            if square[0] == 'w':
-                score += piece_value[square[1]]
-            elif square[0] == 'b':
-                score -= piece_value[square[1]]
-    return score
+    return gs.get_evaluation() # material and piece-square tables, kept up to date by GameState on every move
 
 def find_random_move(gs: GameState, valid_moves: list[Move]) -> Move:
     '''Generate a random move out of all possible moves'''
     return valid_moves[random.randint(0, len(valid_moves) - 1)]
 
-def find_move_greedy(gs: GameState, valid_moves: list[Move]) -> Move:
-    '''Find best move our of valid moves based on material score'''
+
+
+class Searcher():
+    '''
+    One AI player, owning everything a search changes:
+     - best moves, principal variation, score and stats of the last search
+     - node counters and limits (deadline, node limit, stop callable) checked inside the search
+     - transposition table and move orderer (killer moves and history scores)
+    Searchers share no mutable state, so several can search at the same time in threads or tasks of one process
+    (each with its own GameState). Pass get_shared_table() to let them use one process-wide transposition table
+    '''
     
-    global best_moves
+    def __init__(self, transposition_table: TranspositionTable = None, tt_size_mb: float = TT_SIZE_MB):
+        self.transposition_table = transposition_table if transposition_table is not None else TranspositionTable(tt_size_mb)
+        self.move_orderer = MoveOrderer()
+        self.stop = None # optional callable checked together with the clock, search stops when it returns True (cancellation)
+        self.best_moves = [] # equally good moves found by the last search
+        self.principal_variation = [] # best line found by the last completed iteration of iterative deepening
+        self.last_score = 0 # score returned by the search function of the last find_best_move call
+        self.last_stats = SearchStats() # stats of the last find_best_move call
+        
+        # limits checked inside the search, only active while iterative deepening runs
+        self.limits_active = False
+        self.deadline = float('inf')
+        self.node_limit = float('inf')
+        self.new_search()
     
-    color_multi = 1 if gs.white_to_move else -1
-    best_score = float('-inf')
+    def new_search(self) -> None:
+        '''Reset per search counters and age the tables, called before searching a new position'''
+        
+        self.best_moves = []
+        self.counter = 0 # nodes, quiescence included
+        self.qcounter = 0 # quiescence nodes
+        self.seldepth = 0 # deepest ply reached
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.iterations = [] # completed iterations of iterative deepening
+        self.transposition_table.new_search()
+        self.move_orderer.new_search()
+        self.search_start = time.perf_counter()
     
-    for move in valid_moves:
-        if move.is_promotion:
-            move.promotion_piece = move.piece_moved[0] + 'Q'
-        gs.make_move(move)
-        gs.get_valid_moves()
-        if gs.checkmate:
-            score = CHECKMATE
-        elif gs.stalemate:
-            score = STALEMATE
-        else:
-            score = color_multi * get_material_score(gs)
-        if score > best_score:
-            best_score = score
-            best_moves.clear()
-            best_moves.append(move)
-        elif score == best_score:
-            best_moves.append(move) 
+    def new_game(self) -> None:
+        '''Forget everything learned from earlier positions'''
         
-        gs.undo_last_move()
-
-    return best_moves[random.randint(0, len(best_moves) - 1)]
-
-def find_move_minmax_no_recursion(gs: GameState, valid_moves: list[Move]) -> Move:
-    '''Minmax algorithm to find best move (1 move deep)'''
-    global best_moves
+        self.transposition_table.clear()
+        self.move_orderer = MoveOrderer()
     
-    best_score = float('inf')
-    color_multi = 1 if gs.white_to_move else -1
-
-    for move in valid_moves:
-        branch_max_score = float('-inf') # set min value that we compare against
-        gs.make_move(move)
-        opp_moves = gs.get_valid_moves()
+    def get_search_stats(self) -> SearchStats:
+        '''Stats of the search since the last new_search'''
+        
+        stats = SearchStats()
+        stats.nodes = self.counter
+        stats.qnodes = self.qcounter
+        stats.seldepth = self.seldepth
+        stats.iterations = self.iterations[:]
+        stats.depth = self.iterations[-1]['depth'] if self.iterations else 0
+        stats.tt_probes = self.tt_probes
+        stats.tt_hits = self.tt_hits
+        stats.cutoffs = self.move_orderer.cutoffs
+        stats.first_move_cutoffs = self.move_orderer.first_move_cutoffs
+        stats.time = time.perf_counter() - self.search_start
+        return stats
+    
+    def find_best_move(self, function, queue = None, with_stats: bool = False, **kwargs):
+        '''
+        Helper function to call other specified search methods based on chosen algorithm, returns the move and puts it in queue if given.
+        Stats of the search are left in last_stats, with_stats returns (move, stats) instead of the move
+        '''
+        
+        gs = kwargs['gs']
+        
+        undo_log = gs.undo_log # search fills the undo log with every move it takes back, set the player's redo moves aside
+        gs.undo_log = []
+        self.new_search()
+        self.last_score = function(**kwargs)
+        self.last_stats = self.get_search_stats()
+        gs.undo_log = undo_log
+        best_moves = self.best_moves
+        move = best_moves[random.randint(0, len(best_moves) - 1)] if best_moves else None
+        if queue is not None:
+            queue.put(move) # add the ai move to return queue for the process
+        return (move, self.last_stats) if with_stats else move
+    
+    def out_of_time(self) -> bool:
+        '''Clock and stop callable, checked every 1024 nodes while limits are active'''
+        
+        return time.perf_counter() >= self.deadline or (self.stop is not None and self.stop())
+    
+    def find_move_greedy(self, gs: GameState, valid_moves: list[Move]) -> Move:
+        '''Find best move our of valid moves based on material score'''
         
-        # if no moves for opponent, draw or checkmate
-        if gs.checkmate:
-            branch_max_score = -CHECKMATE
-        elif gs.stalemate:
-            branch_max_score = STALEMATE
+        best_moves = self.best_moves
+        color_multi = 1 if gs.white_to_move else -1
+        best_score = float('-inf')
         
+        for move in valid_moves:
+            gs.make_move(move)
+            gs.get_valid_moves()
+            if gs.checkmate:
+                score = CHECKMATE
+            elif gs.draw_reason is not None:
+                score = STALEMATE
+            else:
+                score = color_multi * get_material_score(gs)
+            if score > best_score:
+                best_score = score
+                best_moves.clear()
+                best_moves.append(move)
+            elif score == best_score:
+                best_moves.append(move) 
+            
+            gs.undo_last_move()
+    
+        return best_moves[random.randint(0, len(best_moves) - 1)]
+    
+    def find_move_minmax_no_recursion(self, gs: GameState, valid_moves: list[Move]) -> Move:
+        '''Minmax algorithm to find best move (1 move deep)'''
+        
+        best_moves = self.best_moves
+        best_score = float('inf')
+        color_multi = 1 if gs.white_to_move else -1
+    
+        for move in valid_moves:
+            branch_max_score = float('-inf') # set min value that we compare against
+            gs.make_move(move)
+            opp_moves = gs.get_valid_moves()
+            
+            # if no moves for opponent, draw or checkmate
+            if gs.checkmate:
+                branch_max_score = -CHECKMATE
+            elif gs.draw_reason is not None:
+                branch_max_score = STALEMATE
+            
+            else:
+                for opp_move in opp_moves:
+                    # find max score for opponent after each player move
+                    gs.make_move(opp_move)
+                    gs.get_valid_moves()
+                    if gs.checkmate:
+                        score = CHECKMATE
+                    elif gs.draw_reason is not None:
+                        score = STALEMATE
+                    else:
+                        score = - color_multi * get_material_score(gs)
+                    if score > branch_max_score:
+                        branch_max_score = score                            
+                    gs.undo_last_move()
+            
+            # find min out of all best opponent scores
+            if branch_max_score < best_score:
+                best_score = branch_max_score
+                best_moves.clear()
+                best_moves.append(move)
+            elif branch_max_score == best_score:
+                best_moves.append(move) 
+            
+            gs.undo_last_move()  
+    
+        return best_moves[random.randint(0, len(best_moves) - 1)]
+    
+    def find_move_minmax(self, gs: GameState, valid_moves: list[Move], depth: int = DEPTH, ply: int = 0) -> int:
+        '''Minmax algorithm to find best move for AI based on depth, best moves are collected at the root (ply 0)'''
+        
+        self.counter += 1
+        if depth == 0 or (ply > 0 and gs.draw_reason is not None):
+            return get_board_score(gs)
+        
+        if gs.white_to_move:
+            max_score = float('-inf')
+            for move in valid_moves:
+                gs.make_move(move)
+                next_moves = gs.get_valid_moves()
+                score = self.find_move_minmax(gs, next_moves, depth - 1, ply + 1)
+                if score > max_score:
+                    max_score = score
+                    if ply == 0:
+                        self.best_moves.clear()
+                        self.best_moves.append(move)
+                elif score == max_score:
+                    if ply == 0:
+                        self.best_moves.append(move)
+                gs.undo_last_move()       
+            return max_score
+    
         else:
-            for opp_move in opp_moves:
-                # find max score for opponent after each player move
-                if opp_move.is_promotion:
-                    opp_move.promotion_piece = opp_move.piece_moved[0] + 'Q' # always promote to queen for ai
-                gs.make_move(opp_move)
-                gs.get_valid_moves()
-                if gs.checkmate:
-                    score = CHECKMATE
-                elif gs.stalemate:
-                    score = STALEMATE
-                else:
-                    score = - color_multi * get_material_score(gs)
-                if score > branch_max_score:
-                    branch_max_score = score                            
+            min_score = float('inf')
+            for move in valid_moves:
+                gs.make_move(move)
+                next_moves = gs.get_valid_moves()
+                score = self.find_move_minmax(gs, next_moves, depth - 1, ply + 1)
+                if score < min_score:
+                    min_score = score
+                    if ply == 0:
+                        self.best_moves.clear()
+                        self.best_moves.append(move)
+                elif score == min_score:
+                    if ply == 0:
+                        self.best_moves.append(move)
                 gs.undo_last_move()
+    
+            return min_score
         
-        # find min out of all best opponent scores
-        if branch_max_score < best_score:
-            best_score = branch_max_score
-            best_moves.clear()
-            best_moves.append(move)
-        elif branch_max_score == best_score:
-            best_moves.append(move) 
+    def find_move_negamax(self, gs: GameState, valid_moves: list[Move], depth: int = DEPTH, ply: int = 0):
+        '''Negamax algorithm to find best move for AI based on depth, best moves are collected at the root (ply 0)'''
         
-        gs.undo_last_move()  
-
-    return best_moves[random.randint(0, len(best_moves) - 1)]
-
-def find_move_minmax(gs: GameState, valid_moves: list[Move], depth: int) -> int:
-    '''Minmax algorithm to find best move for AI based on depth'''
-    
-    global best_moves
-    f = open('move_log.txt', 'a')
-    if depth == 0:
-        return get_board_score(gs)
+        self.counter += 1 # number of calls for this function
+        
+        if ply > 0 and gs.draw_reason is not None: # set by get_valid_moves for stalemate, fifty-move rule and threefold repetition
+            return STALEMATE
+        if depth == 0:
+            return self.quiescence_search(gs, float('-inf'), float('inf'), ply) # base case for recursion, play out captures first
     
-    if gs.white_to_move:
         max_score = float('-inf')
         for move in valid_moves:
             gs.make_move(move)
             next_moves = gs.get_valid_moves()
-            score = find_move_minmax(gs, next_moves, depth - 1)
+            # always find max score inside because of -color_multi, and then always find min score outside because of - before function call
+            score = -self.find_move_negamax(gs, next_moves, depth - 1, ply + 1)
             if score > max_score:
                 max_score = score
-                if depth == DEPTH:
-                    best_moves.clear()
-                    best_moves.append(move)
+                if ply == 0:
+                    self.best_moves.clear()
+                    self.best_moves.append(move)
             elif score == max_score:
-                if depth == DEPTH:
-                    best_moves.append(move)
-            gs.undo_last_move()       
-        return max_score
-
-    else:
-        min_score = float('inf')
-        for move in valid_moves:
-            gs.make_move(move)
-            next_moves = gs.get_valid_moves()
-            score = find_move_minmax(gs, next_moves, depth - 1)
-            if score < min_score:
-                min_score = score
-                if depth == DEPTH:
-                    best_moves.clear()
-                    best_moves.append(move)
-            elif score == min_score:
-                if depth == DEPTH:
-                    best_moves.append(move)
+                if ply == 0:
+                    self.best_moves.append(move)
             gs.undo_last_move()
-
-        return min_score
-    
-def find_move_negamax(gs: GameState, valid_moves: list[Move], depth: int):
-    '''Negamax algorithm to find best move for AI based on depth'''
-
-    
-    global best_moves, counter
+        return max_score
     
-    counter += 1 # number of calls for this function
-    color_multi = 1 if gs.white_to_move else -1 # multiplier for negamax to work, so best score is always positive
+    def find_move_negamax_ab_pruning(self, gs: GameState, valid_moves: list[Move], depth: int = DEPTH, alpha: float = float('-inf'), beta: float = float('inf'), ply: int = 0):
+        '''
+        Negamax algorithm with alpha-beta pruning and transposition table to find best move for AI based on depth.
+        valid_moves is only passed at the root, inner nodes take moves lazily from the staged generator of move_orderer
+        '''
+        
+        self.counter = counter = self.counter + 1 # number of calls for this function
+        if self.limits_active and (counter >= self.node_limit or (counter & 1023 == 0 and self.out_of_time())):
+            raise SearchTimeout()
+        color_multi = 1 if gs.white_to_move else -1 # multiplier for negamax to work, so best score is always positive
+        
+        if valid_moves is not None and not valid_moves:
+            return color_multi * get_board_score(gs) # checkmate/stalemate at the root
+        # twofold repetition is scored as a draw inside the tree, whoever repeated can repeat again up to threefold
+        if ply > 0 and gs.halfmoves >= 4 and (gs.is_repetition() or gs.is_fifty_move_draw()):
+            return STALEMATE
+        if depth == 0:
+            return self.quiescence_search(gs, alpha, beta, ply) # base case for recursion, play out captures first
+        
+        # transposition table, root is always searched to collect all best moves
+        transposition_table = self.transposition_table
+        alpha_orig = alpha
+        key = gs.zobrist_key
+        tt_move = 0
+        self.tt_probes += 1
+        entry = transposition_table.probe(key)
+        if entry is not None:
+            self.tt_hits += 1
+            tt_depth, tt_score, tt_bound, tt_move = entry
+            tt_score = score_from_tt(tt_score, ply)
+            if ply > 0 and tt_depth >= depth:
+                if tt_bound == EXACT:
+                    return tt_score
+                elif tt_bound == LOWER_BOUND:
+                    alpha = max(alpha, tt_score)
+                else:
+                    beta = min(beta, tt_score)
+                if alpha >= beta:
+                    return tt_score
     
-    if depth == 0:
-        if gs.checkmate:
-            return -color_multi * get_board_score(gs)
+        # hash move, captures by MVV-LVA, killers, then quiet moves by history
+        move_orderer = self.move_orderer
+        if valid_moves is None:
+            moves = move_orderer.generate_moves(gs, ply, tt_move) # later stages are never generated if an early move cuts off
         else:
-            return color_multi * get_board_score(gs) # base case for recursion
-
-    max_score = float('-inf')
-    for move in valid_moves:
-        gs.make_move(move)
-        next_moves = gs.get_valid_moves()
-        # always find max score inside because of -color_multi, and then always find min score outside because of - before function call
-        score = -find_move_negamax(gs, next_moves, depth - 1)
-        if score > max_score:
-            max_score = score
-            if depth == DEPTH:
-                best_moves.clear()
-                best_moves.append(move)
-        elif score == max_score:
-            if depth == DEPTH:
-                best_moves.append(move)
-        gs.undo_last_move()
-    return max_score
-
-def find_move_negamax_ab_pruning(gs: GameState, valid_moves: list[Move], depth: int, alpha: float = float('-inf'), beta: float = float('inf')):
-    '''Negamax algorithm with alpha-beta pruning to find best move for AI based on depth'''
+            moves = move_orderer.order_moves(valid_moves, ply, tt_move, gs.white_to_move)
+        max_score = float('-inf')
+        best_move = None
+        for move_number, move in enumerate(moves):
+            gs.make_move(move)
+            # always find max score inside because of -color_multi, and then always find min score outside because of - before function call
+            # at the root alpha is lowered by one, so a move scoring the same as the best is an exact tie and not just an upper bound
+            score = -self.find_move_negamax_ab_pruning(gs, None, depth - 1, -beta, -(alpha - 1) if ply == 0 else -alpha, ply + 1)
+            if score > max_score:
+                max_score = score
+                best_move = move
+                if ply == 0:
+                    self.best_moves.clear()
+                    self.best_moves.append(move)
+            elif score == max_score:
+                if ply == 0:
+                    self.best_moves.append(move)
+            gs.undo_last_move()
+            if max_score > alpha: #pruning happens
+                alpha = max_score # new best thus far
+            if alpha >= beta:
+                move_orderer.record_cutoff(move, ply, depth, move_number, tt_move, gs.white_to_move)
+                break
+        
+        if best_move is None: # generator yielded nothing - checkmate or stalemate
+            return -(CHECKMATE - ply) if gs.in_check() else STALEMATE
+        
+        if max_score <= alpha_orig:
+            bound = UPPER_BOUND
+        elif max_score >= beta:
+            bound = LOWER_BOUND
+        else:
+            bound = EXACT
+        transposition_table.store(key, depth, score_to_tt(max_score, ply), bound, best_move.code)
+        return max_score
     
-    global best_moves, counter
+    def quiescence_search(self, gs: GameState, alpha: float, beta: float, ply: int = 0) -> int:
+        '''
+        Search only captures and promotions until the position is quiet, so leaf scores are not taken in the middle of an exchange:
+         - stand pat: side to move can decline all captures, so static score is a lower bound
+         - delta pruning: skip captures that can't raise alpha even when winning the captured piece plus a margin
+         - in check all evasions are searched, as standing pat is not an option
+        '''
+        
+        self.counter = counter = self.counter + 1
+        self.qcounter += 1
+        if ply > self.seldepth:
+            self.seldepth = ply
+        if self.limits_active and (counter >= self.node_limit or (counter & 1023 == 0 and self.out_of_time())):
+            raise SearchTimeout()
+        color_multi = 1 if gs.white_to_move else -1
+        
+        in_check = gs.in_check()
+        if in_check:
+            moves = gs.get_valid_moves()
+            if not moves:
+                return -(CHECKMATE - ply) # checkmate
+            stand_pat = max_score = float('-inf')
+        else:
+            stand_pat = max_score = color_multi * get_board_score(gs)
+            if stand_pat >= beta:
+                return stand_pat
+            if stand_pat > alpha:
+                alpha = stand_pat
+            moves = gs.get_capture_moves()
+        
+        for move in self.move_orderer.order_moves(moves, ply, 0, gs.white_to_move):
+            if not in_check:
+                if move.code >= 8192: # promotion to rook, bishop or knight, queen promotion is searched instead
+                    continue
+                if not move.is_promotion and stand_pat + piece_value[move.piece_captured[1]] + DELTA_MARGIN <= alpha:
+                    continue # delta pruning
+            gs.make_move(move)
+            score = -self.quiescence_search(gs, -beta, -alpha, ply + 1)
+            gs.undo_last_move()
+            if score > max_score:
+                max_score = score
+            if max_score > alpha:
+                alpha = max_score
+            if alpha >= beta:
+                break
+        return max_score
     
-    counter += 1 # number of calls for this function
-    color_multi = 1 if gs.white_to_move else -1 # multiplier for negamax to work, so best score is always positive
+    def find_move_iterative_deepening(self, gs: GameState, valid_moves: list[Move], depth: int = MAX_DEPTH, time_limit: float = None, node_limit: int = None, info_callback = None) -> int:
+        '''
+        Iterative deepening: alpha-beta negamax to depth 1, 2, 3... until depth, time (seconds) or node limit is reached.
+        Best moves of the deepest completed iteration are left in best_moves, its score is returned.
+        info_callback(depth, score, nodes, seconds, principal variation) is called after every completed iteration
+        '''
+        
+        start_time = time.perf_counter()
+        self.deadline = start_time + time_limit if time_limit is not None else float('inf')
+        self.node_limit = self.counter + node_limit if node_limit is not None else float('inf')
+        root_ply = len(gs.move_log)
+        completed_moves = []
+        score = 0
+        
+        for d in range(1, depth + 1):
+            iteration_start = time.perf_counter()
+            iteration_nodes = self.counter
+            self.limits_active = d > 1 # always complete depth 1 so there is a move to play
+            if completed_moves:
+                # previous iteration's best moves go first, the rest of its principal variation is tried first through the transposition table
+                valid_moves = completed_moves + [move for move in valid_moves if move not in completed_moves]
+            self.best_moves = []
+            try:
+                iteration_score = self.find_move_negamax_ab_pruning(gs, valid_moves, d)
+            except SearchTimeout:
+                while len(gs.move_log) > root_ply: # unwind moves made by the interrupted iteration
+                    gs.undo_last_move()
+                break
+            completed_moves = self.best_moves[:]
+            score = iteration_score
+            self.principal_variation = self.get_principal_variation(gs, d)
+            self.iterations.append({'depth': d, 'score': score, 'nodes': self.counter - iteration_nodes, 'time': time.perf_counter() - iteration_start})
+            if info_callback is not None:
+                info_callback(d, score, self.counter, time.perf_counter() - start_time, self.principal_variation)
+            if abs(score) >= MATE_THRESHOLD: # forced mate found, deeper search won't change the result
+                break
+            if time_limit is not None and time.perf_counter() - start_time > time_limit / 2: # next iteration would not finish in time
+                break
+        
+        self.limits_active = False
+        self.best_moves = completed_moves
+        return score
     
-    if depth == 0:
-        if gs.checkmate:
-            return -color_multi * get_board_score(gs)
-        else:
-            return color_multi * get_board_score(gs) # base case for recursion
-
-    # Implement move ordering to increase efficiency
-    max_score = float('-inf')
-    for move in valid_moves:
-        gs.make_move(move)
-        next_moves = gs.get_valid_moves()
-        # always find max score inside because of -color_multi, and then always find min score outside because of - before function call
-        score = -find_move_negamax_ab_pruning(gs, next_moves, depth - 1, -beta, -alpha)
-        if score > max_score:
-            max_score = score
-            if depth == DEPTH:
-                best_moves.clear()
-                best_moves.append(move)
-        elif score == max_score:
-            if depth == DEPTH:
-                best_moves.append(move)
-        gs.undo_last_move()
-        if max_score > alpha: #pruning happens
-            alpha = max_score # new best thus far
-        if alpha >= beta:
-            break
-    return max_score
-
+    def get_principal_variation(self, gs: GameState, depth: int) -> list[Move]:
+        '''Follow best moves stored in the transposition table from current position'''
+        
+        pv = []
+        for _ in range(depth):
+            entry = self.transposition_table.probe(gs.zobrist_key)
+            if entry is None or not entry[3]:
+                break
+            move = next((move for move in gs.get_valid_moves() if move.code == entry[3]), None)
+            if move is None:
+                break
+            pv.append(move)
+            gs.make_move(move)
+        for _ in pv:
+            gs.undo_last_move()
+        return pv
 
 
 if __name__ == "__main__":
@@ -1,12 +1,77 @@
-import copy
+import random
+from functools import lru_cache
+from itertools import product
+from collections.abc import Iterator # typing is slow to import
+from PieceSquareTables import MATERIAL, SQUARE_VALUES
+from Bitboards import (SQUARES, SQUARE_BB, FULL_BOARD, FILE_A, FILE_H, ROWS, BETWEEN, LINE, bit_squares,
+                       KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, rook_attacks, bishop_attacks, queen_attacks)
+
+# Zobrist keys, fixed seed so every process hashes positions the same way
+_zobrist_random = random.Random(20230101)
+ZOBRIST_PIECES = {color + piece: [_zobrist_random.getrandbits(64) for _ in range(64)] for color in 'wb' for piece in 'PRNBQK'}
+ZOBRIST_BLACK_TO_MOVE = _zobrist_random.getrandbits(64)
+ZOBRIST_CASTLING = {rights: _zobrist_random.getrandbits(64) for rights in product((True, False), repeat=4)} # keyed by castle_rights tuple
+ZOBRIST_ENPASSANT = [_zobrist_random.getrandbits(64) for _ in range(8)] # keyed by en passant file
+
+# Move.flags bits
+ENPASSANT = 1
+CASTLING = 2
+CHECK = 4
+CHECKMATE = 8
+STALEMATE = 16
+
+# promotion piece codes, stored in bits 12-14 of Move.code
+PROMOTION_CODES = {'Q': 1, 'R': 2, 'B': 3, 'N': 4}
+PROMOTION_PIECES = ('', 'Q', 'R', 'B', 'N')
+
+FEN_PIECES = {'P': 'wP', 'N': 'wN', 'B': 'wB', 'R': 'wR', 'Q': 'wQ', 'K': 'wK',
+              'p': 'bP', 'n': 'bN', 'b': 'bB', 'r': 'bR', 'q': 'bQ', 'k': 'bK'}
+PIECES_FEN = {piece: char for char, piece in FEN_PIECES.items()}
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+
+@lru_cache(maxsize=1 << 16)
+def parse_fen_row(r: int, row: str) -> tuple:
+    '''
+    Parse FEN board row r (0 is the 8th rank) into (pieces, [(piece, bitboard)], Zobrist piece key, evaluation terms),
+    evaluation terms are (white material, black material, white psqt, black psqt) sums of the row.
+    Cached, as the same rows repeat across positions ('8', 'pppppppp', ...), which makes loading large FEN files much faster
+    '''
+    
+    pieces = []
+    for char in row:
+        if char in FEN_PIECES:
+            pieces.append(FEN_PIECES[char])
+        elif char in '12345678':
+            pieces.extend(('--',) * int(char))
+        else:
+            raise ValueError(f'Invalid FEN row: {row!r}')
+    if len(pieces) != 8:
+        raise ValueError(f'Invalid FEN row: {row!r}')
+    
+    placements = []
+    key = 0
+    terms = [0, 0, 0, 0]
+    for c, piece in enumerate(pieces):
+        if piece != '--':
+            sq = r * 8 + c
+            placements.append((piece, SQUARE_BB[sq]))
+            key ^= ZOBRIST_PIECES[piece][sq]
+            black = piece[0] == 'b'
+            terms[black] += MATERIAL[piece]
+            terms[2 + black] += SQUARE_VALUES[piece][sq]
+    return tuple(pieces), tuple(placements), key, tuple(terms)
+
 
 class GameState():
     '''
     Class provides information on current position in the chess game:
-     - state of the board
+     - state of the board (list of lists view and one bitboard per colored piece)
      - move log
+     - 64-bit Zobrist key of the position, updated incrementally
+     - material and piece-square table sums per side, updated incrementally
     '''
-    def __init__(self):
+    def __init__(self, fen: str = None):
         self.board = [
             ['bR','bN','bB','bQ','bK','bB','bN','bR'],            
             ['bP','bP','bP','bP','bP','bP','bP','bP'],
@@ -30,28 +95,248 @@ class GameState():
         self.undo_log = []
         self.checkmate = False
         self.stalemate = False
+        self.draw_reason = None # 'stalemate', 'fifty-move rule' or 'threefold repetition' once the game is drawn, set by get_valid_moves
         self.enpassant_possible = () # track square (row, col) that can be taken en passant, if exists
         self.castle_rights = (True, True, True, True) # white queen side, white king side, black queen side, black king side
-        self.castle_rights_log = [self.castle_rights]
         self.fullmoves = 1 # for notation, increments after black's move
         self.halfmoves = 0 # half moves without captures
-        self.halfmove_log = [0]
+        self.state_stack = [] # (castle rights, en passant square, halfmoves, Zobrist key) before every move of move_log
+        self.start_fen = START_FEN # position the move log starts from
+        self.attack_cache = {} # check info and attack maps of the current position, emptied whenever it changes
+        
+        if fen is None:
+            self.reset_board_state()
+        else:
+            self.load_fen(fen) # replaces the starting position set up above
+    
+    @classmethod
+    def from_fen(cls, fen: str) -> 'GameState':
+        '''New game state set up from FEN string'''
+        
+        return cls(fen)
+    
+    @classmethod
+    def from_moves(cls, fen: str, moves: list[str]) -> 'GameState':
+        '''New game state set up from FEN string with moves (long algebraic notation) played, raises ValueError for invalid FENs or moves'''
+        
+        gs = cls(fen)
+        for notation in moves:
+            gs.make_move(gs.get_move_from_uci(notation))
+        return gs
+    
+    def load_fen(self, fen: str) -> None:
+        '''
+        Set up position from FEN (Forsyth-Edwards Notation) string, move history is cleared.
+        Halfmove clock and fullmove number fields are optional. Raises ValueError for malformed strings and impossible positions
+        (pawns on the first or last rank, en passant square without the pawn that just moved past it, side not to move in check)
+        '''
+        
+        fields = fen.split()
+        if len(fields) < 4 or fields[1] not in ('w', 'b'):
+            raise ValueError(f'Invalid FEN: {fen!r}')
+        rows = fields[0].split('/')
+        if len(rows) != 8:
+            raise ValueError(f'Invalid FEN board: {fen!r}')
+        # board, bitboards and evaluation terms are summed from cached rows instead of scanning all squares
+        board = []
+        bitboards = {color + piece: 0 for color in 'wb' for piece in 'PRNBQK'}
+        key = white_material = black_material = white_psqt = black_psqt = 0
+        try:
+            for r, row in enumerate(rows):
+                pieces, placements, row_key, (w_mat, b_mat, w_psqt, b_psqt) = parse_fen_row(r, row)
+                board.append(list(pieces))
+                for piece, bb in placements:
+                    bitboards[piece] |= bb
+                key ^= row_key
+                white_material += w_mat
+                black_material += b_mat
+                white_psqt += w_psqt
+                black_psqt += b_psqt
+        except ValueError:
+            raise ValueError(f'Invalid FEN board: {fen!r}') from None
+        for king in ('wK', 'bK'):
+            if not bitboards[king] or bitboards[king] & (bitboards[king] - 1):
+                raise ValueError(f'Invalid FEN, each side needs exactly one king: {fen!r}')
+        if (bitboards['wP'] | bitboards['bP']) & (ROWS[0] | ROWS[7]):
+            raise ValueError(f'Invalid FEN, pawns on the first or last rank: {fen!r}')
+        white_to_move = fields[1] == 'w'
+        occupied = bitboards['wP'] | bitboards['bP'] | bitboards['wN'] | bitboards['bN'] | bitboards['wB'] | bitboards['bB'] | \
+                   bitboards['wR'] | bitboards['bR'] | bitboards['wQ'] | bitboards['bQ'] | bitboards['wK'] | bitboards['bK']
+        if fields[3] == '-':
+            enpassant = ()
+        elif len(fields[3]) == 2 and fields[3][0] in Move.files_to_cols and fields[3][1] == ('6' if white_to_move else '3'):
+            enpassant = (Move.ranks_to_rows[fields[3][1]], Move.files_to_cols[fields[3][0]])
+            sq = enpassant[0] * 8 + enpassant[1]
+            d = 8 if white_to_move else -8 # towards the pawn that moved two squares
+            # the pawn stands past the square, which is empty like the one it started from
+            if not bitboards[('b' if white_to_move else 'w') + 'P'] & SQUARE_BB[sq + d] or occupied & (SQUARE_BB[sq] | SQUARE_BB[sq - d]):
+                raise ValueError(f'Invalid FEN en passant square, no pawn just moved past it: {fen!r}')
+        else:
+            raise ValueError(f'Invalid FEN en passant square: {fen!r}')
+        
+        self.board = board
+        self.bitboards = bitboards
+        self.occupancy = {'w': bitboards['wP'] | bitboards['wN'] | bitboards['wB'] | bitboards['wR'] | bitboards['wQ'] | bitboards['wK'],
+                          'b': bitboards['bP'] | bitboards['bN'] | bitboards['bB'] | bitboards['bR'] | bitboards['bQ'] | bitboards['bK']}
+        self.material = {'w': white_material, 'b': black_material}
+        self.psqt = {'w': white_psqt, 'b': black_psqt}
+        self.white_to_move = white_to_move
+        castling = fields[2]
+        # a right only counts with king and rook still on their home squares, bits 60/56/63 are e1/a1/h1 and 4/0/7 are e8/a8/h8
+        white_king = bool(bitboards['wK'] >> 60 & 1)
+        black_king = bool(bitboards['bK'] >> 4 & 1)
+        self.castle_rights = ('Q' in castling and white_king and bool(bitboards['wR'] >> 56 & 1),
+                              'K' in castling and white_king and bool(bitboards['wR'] >> 63 & 1),
+                              'q' in castling and black_king and bool(bitboards['bR'] & 1),
+                              'k' in castling and black_king and bool(bitboards['bR'] >> 7 & 1))
+        self.enpassant_possible = enpassant
+        if self.is_square_attacked(bitboards['bK' if white_to_move else 'wK'].bit_length() - 1, 'w' if white_to_move else 'b'):
+            raise ValueError(f'Invalid FEN, the side not to move is in check: {fen!r}')
+        self.halfmoves = int(fields[4]) if len(fields) > 4 else 0
+        self.fullmoves = int(fields[5]) if len(fields) > 5 else 1
+        
+        self.move_log = []
+        self.undo_log = []
+        self.checkmate = False
+        self.stalemate = False
+        self.draw_reason = None
+        self.state_stack = []
+        self.start_fen = fen
+        self.attack_cache = {}
+        self.zobrist_key = key ^ self.get_state_key()
+    
+    def to_fen(self) -> str:
+        '''FEN (Forsyth-Edwards Notation) string of the current position'''
+        
+        rows = []
+        for row in self.board:
+            fen_row = ''
+            empty = 0
+            for piece in row:
+                if piece == '--':
+                    empty += 1
+                else:
+                    if empty:
+                        fen_row += str(empty)
+                        empty = 0
+                    fen_row += PIECES_FEN[piece]
+            if empty:
+                fen_row += str(empty)
+            rows.append(fen_row)
+        
+        castling = ''.join(letter for letter, right in zip('KQkq', (self.castle_rights[1], self.castle_rights[0], self.castle_rights[3], self.castle_rights[2])) if right) or '-'
+        enpassant = Move.cols_to_files[self.enpassant_possible[1]] + Move.rows_to_ranks[self.enpassant_possible[0]] if self.enpassant_possible else '-'
+        return f"{'/'.join(rows)} {'w' if self.white_to_move else 'b'} {castling} {enpassant} {self.halfmoves} {self.fullmoves}"
+    
+    def reset_board_state(self) -> None:
+        '''Rebuild bitboards, evaluation terms and Zobrist key from self.board and the side/castling/en passant state'''
+        
+        # bitboards, bit (row * 8 + col) is set if the piece is on that square, kept in sync with self.board
+        self.bitboards = {color + piece: 0 for color in 'wb' for piece in 'PRNBQK'}
+        self.occupancy = {'w': 0, 'b': 0} # all squares occupied by each color
+        # evaluation terms in centipawns, kept in sync with self.board
+        self.material = {'w': 0, 'b': 0}
+        self.psqt = {'w': 0, 'b': 0} # piece-square table sums
+        for r, row in enumerate(self.board):
+            for c, piece in enumerate(row):
+                if piece != '--':
+                    self.bitboards[piece] |= SQUARE_BB[r * 8 + c]
+                    self.occupancy[piece[0]] |= SQUARE_BB[r * 8 + c]
+                    self.material[piece[0]] += MATERIAL[piece]
+                    self.psqt[piece[0]] += SQUARE_VALUES[piece][r * 8 + c]
+        
+        self.zobrist_key = self.compute_zobrist_key()
+        self.attack_cache = {}
+        
+    def get_zobrist_key(self) -> int:
+        '''Returns 64-bit Zobrist key of the current position (pieces, side to move, castle rights, en passant)'''
+        
+        return self.zobrist_key
+    
+    def get_evaluation(self) -> int:
+        '''Material plus piece-square tables in centipawns, + good for white, - good for black'''
+        
+        return self.material['w'] + self.psqt['w'] - self.material['b'] - self.psqt['b']
+    
+    def compute_zobrist_key(self) -> int:
+        '''Computes Zobrist key of the current position from scratch'''
+        
+        key = self.get_state_key()
+        for piece, bb in self.bitboards.items():
+            while bb:
+                lsb = bb & -bb
+                key ^= ZOBRIST_PIECES[piece][lsb.bit_length() - 1]
+                bb ^= lsb
+        return key
+    
+    def get_state_key(self) -> int:
+        '''Part of Zobrist key for side to move, castle rights and en passant file (only if en passant capture is possible)'''
         
+        key = ZOBRIST_CASTLING[self.castle_rights]
+        if self.white_to_move:
+            color = 'w'
+        else:
+            color = 'b'
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        if self.enpassant_possible:
+            r, c = self.enpassant_possible
+            if PAWN_ATTACKS['b' if color == 'w' else 'w'][r * 8 + c] & self.bitboards[color + 'P']: # pawns that can take en passant
+                key ^= ZOBRIST_ENPASSANT[c]
+        return key
         
     def get_piece(self, square: tuple[int, int]) -> str:
         '''Fetches which piece is located on the specified square, returns '--' if empty'''
         
         return self.board[square[0]][square[1]]
     
+    def get_king_square(self, color: str = None) -> tuple[int, int]:
+        '''(row, col) of the king of color (side to move by default), read from its bitboard instead of scanning the board'''
+        
+        if color is None:
+            color = 'w' if self.white_to_move else 'b'
+        return SQUARES[self.bitboards[color + 'K'].bit_length() - 1]
+    
+    def get_piece_squares(self, piece: str) -> list[tuple[int, int]]:
+        '''(row, col) of every piece of the kind (e.g. 'wN'), the bitboards are the per-side piece lists'''
+        
+        return [SQUARES[sq] for sq in bit_squares(self.bitboards[piece])]
+    
     def remove_piece(self, square: tuple[int, int]) -> None:
         '''Updates specified board square with the "empty" notation ('--') replacing what is currently there'''
         
-        self.board[square[0]][square[1]] = '--'
+        r, c = square
+        piece = self.board[r][c]
+        if piece != '--':
+            sq = r * 8 + c
+            color = piece[0]
+            self.bitboards[piece] ^= SQUARE_BB[sq]
+            self.occupancy[color] ^= SQUARE_BB[sq]
+            self.zobrist_key ^= ZOBRIST_PIECES[piece][sq]
+            self.material[color] -= MATERIAL[piece]
+            self.psqt[color] -= SQUARE_VALUES[piece][sq]
+        self.board[r][c] = '--'
         
     def add_piece(self, square: tuple[int, int], piece: str) -> None:
         '''Updates specified board square with specified piece replacing what is currently there'''
         
-        self.board[square[0]][square[1]] = piece
+        r, c = square
+        sq = r * 8 + c
+        old_piece = self.board[r][c]
+        if old_piece != '--':
+            color = old_piece[0]
+            self.bitboards[old_piece] ^= SQUARE_BB[sq]
+            self.occupancy[color] ^= SQUARE_BB[sq]
+            self.zobrist_key ^= ZOBRIST_PIECES[old_piece][sq]
+            self.material[color] -= MATERIAL[old_piece]
+            self.psqt[color] -= SQUARE_VALUES[old_piece][sq]
+        if piece != '--':
+            color = piece[0]
+            self.bitboards[piece] |= SQUARE_BB[sq]
+            self.occupancy[color] |= SQUARE_BB[sq]
+            self.zobrist_key ^= ZOBRIST_PIECES[piece][sq]
+            self.material[color] += MATERIAL[piece]
+            self.psqt[color] += SQUARE_VALUES[piece][sq]
+        self.board[r][c] = piece
                 
     def make_move(self, move) -> None:
         '''
@@ -60,21 +345,31 @@ class GameState():
          - sets target square to the moved piece/promotion piece
          - logs the move
          - updates turn order
+         - updates Zobrist key (pieces are hashed in add_piece/remove_piece)
+         - drops cached attack information of the old position
+         - pushes the state a move can't restore (castle rights, en passant, halfmoves, key) for undo_last_move
+         - clears the draw reason, get_valid_moves sets it again for the new position
         '''
+        self.attack_cache = {}
+        self.draw_reason = None
+        self.state_stack.append((self.castle_rights, self.enpassant_possible, self.halfmoves, self.zobrist_key))
+        self.zobrist_key ^= self.get_state_key() # take out old side to move, castle rights and en passant
         self.remove_piece(move.start_sq)
-        if move.is_promotion:
-            self.add_piece(move.end_sq,move.promotion_piece)
+        start_row, start_col = move.start_sq
+        end_row, end_col = move.end_sq
+        if move.code >= 4096: # promotion
+            self.add_piece(move.end_sq, move.promotion_piece)
         else:
             self.add_piece(move.end_sq, move.piece_moved)
-        if move.is_enpassant:
-            self.remove_piece((move.start_row, move.end_col))    
-        if move.is_castling:
-            if move.start_col > move.end_col: # queen side castle
-                self.remove_piece((move.start_row, 0))
-                self.add_piece((move.start_row, move.end_col + 1), move.piece_moved[0] + 'R')
+        if move.flags & ENPASSANT:
+            self.remove_piece((start_row, end_col))    
+        if move.flags & CASTLING:
+            if start_col > end_col: # queen side castle
+                self.remove_piece((start_row, 0))
+                self.add_piece((start_row, end_col + 1), move.piece_moved[0] + 'R')
             else: # king side castle
-                self.remove_piece((move.start_row, len(self.board[0]) - 1))
-                self.add_piece((move.start_row, move.end_col - 1), move.piece_moved[0] + 'R')
+                self.remove_piece((start_row, len(self.board[0]) - 1))
+                self.add_piece((start_row, end_col - 1), move.piece_moved[0] + 'R')
                 
             
         self.move_log.append(move) # save move to the log so we can undo
@@ -82,8 +377,8 @@ class GameState():
         self.white_to_move = not self.white_to_move # switch turns
         
         # en passant
-        if move.piece_moved[1] == 'P' and abs(move.end_row - move.start_row) == 2: # if pawn moved 2 squares update en passant attr
-            self.enpassant_possible = ((move.end_row + move.start_row)//2, move.start_col)
+        if move.piece_moved[1] == 'P' and abs(end_row - start_row) == 2: # if pawn moved 2 squares update en passant attr
+            self.enpassant_possible = ((end_row + start_row)//2, start_col)
         else:
             self.enpassant_possible = ()
         
@@ -119,24 +414,18 @@ class GameState():
             if move.end_sq == (0, len(self.board[0]) - 1):
                 bks = False
         self.castle_rights = (wqs, wks, bqs, bks)
-        self.castle_rights_log.append(self.castle_rights)
+        self.zobrist_key ^= self.get_state_key() # put in new side to move, castle rights and en passant
          
         # update move number
         if self.white_to_move:
             self.fullmoves += 1
         
-        # update consecutive halfmoves without captures/pawn moves for draw
+        # update consecutive halfmoves without captures/pawn moves for the fifty-move rule
         if move.piece_captured == '--' and not move.piece_moved.endswith('P'):
             self.halfmoves += 1
         else:
-            self.halfmove_log.append(self.halfmoves) # log for undoing moves
             self.halfmoves = 0
         
-        # draw
-        if self.halfmoves == 50:
-            self.stalemate = True
-        
-        
     def undo_last_move(self) -> None:
         '''Rolls back last played move'''
         
@@ -144,135 +433,49 @@ class GameState():
             return
         move = self.move_log.pop()
         self.undo_log.append(move)
+        self.attack_cache = {}
         self.add_piece(move.start_sq, move.piece_moved)
+        start_row, start_col = move.start_sq
+        end_row, end_col = move.end_sq
         
-        if move.is_enpassant:
+        if move.flags & ENPASSANT:
             self.remove_piece(move.end_sq)
-            self.add_piece((move.start_row, move.end_col), move.piece_captured) # add back captured pawn if en passant
+            self.add_piece((start_row, end_col), move.piece_captured) # add back captured pawn if en passant
         else:
             self.add_piece(move.end_sq, move.piece_captured)
         
-        if move.is_castling:
-            if move.start_col > move.end_col: # queen side castle
-                self.remove_piece((move.start_row, move.end_col + 1))
-                self.add_piece((move.start_row, 0), move.piece_moved[0] + 'R')
+        if move.flags & CASTLING:
+            if start_col > end_col: # queen side castle
+                self.remove_piece((start_row, end_col + 1))
+                self.add_piece((start_row, 0), move.piece_moved[0] + 'R')
             else: # king side castle
-                self.remove_piece((move.start_row, move.end_col - 1))                
-                self.add_piece((move.start_row, len(self.board[0]) - 1), move.piece_moved[0] + 'R')
+                self.remove_piece((start_row, end_col - 1))                
+                self.add_piece((start_row, len(self.board[0]) - 1), move.piece_moved[0] + 'R')
         
         self.white_to_move = not self.white_to_move # switch turns
         
-        # en passant
-        if self.move_log: # if something is left in the log, check if en passant was possible last turn
-            prev_move = self.move_log[-1]
-            if prev_move.piece_moved[1] == 'P' and abs(prev_move.end_row - prev_move.start_row) == 2:
-                self.enpassant_possible = ((prev_move.end_row + prev_move.start_row)//2, prev_move.start_col)
-            else:
-                self.enpassant_possible = ()
-        else:
-            self.enpassant_possible = ()
-            
-        # castling rights
-        self.castle_rights_log.pop()
-        self.castle_rights = self.castle_rights_log[-1]
+        # castle rights, en passant, halfmoves and Zobrist key as they were before the move
+        self.castle_rights, self.enpassant_possible, self.halfmoves, self.zobrist_key = self.state_stack.pop()
         
         # checkmate/stalemate
         self.stalemate = False
         self.checkmate = False
+        self.draw_reason = None
         
         # update move number
         if not self.white_to_move:
             self.fullmoves -= 1
-            
-        # update halfmoves
-        if self.halfmoves > 0:
-            self.halfmoves -= 1
-        else:
-            self.halfmoves = self.halfmove_log.pop()
-        
-        
         
     def redo_undone_move(self) -> None:
         '''Replays last cancelled move'''
         
         if len(self.undo_log) == 0: # if no moves in log do nothing
             return
-        move = self.undo_log.pop()
-        self.move_log.append(move)
-        self.remove_piece(move.start_sq)
-        
-        if move.is_promotion:
-            self.add_piece(move.end_sq,move.promotion_piece)
-        else:
-            self.add_piece(move.end_sq, move.piece_moved)
-        
-        if move.is_enpassant:
-            self.remove_piece((move.start_row, move.end_col)) # remove captured pawn if en passant
-        
-        if move.is_castling:
-            if move.start_col > move.end_col: # queen side castle
-                self.remove_piece((move.start_row, 0))
-                self.add_piece((move.start_row, move.end_col + 1), move.piece_moved[0] + 'R')
-            else: # king side castle
-                self.remove_piece((move.start_row, len(self.board[0]) - 1))
-                self.add_piece((move.start_row, move.end_col - 1), move.piece_moved[0] + 'R')
-        
-        self.white_to_move = not self.white_to_move # switch turns
-
-        # en passant       
-        if move.piece_moved[1] == 'P' and abs(move.end_row - move.start_row) == 2: # if pawn moved 2 squares update en passant attr
-            self.enpassant_possible = ((move.end_row + move.start_row)//2, move.start_col)
-        else:
-            self.enpassant_possible = ()
-            
-        # castle rights
-        wqs, wks, bqs, bks = self.castle_rights 
-        # no castling if any pieces move
-        if move.piece_moved == 'wK':
-            wqs = False
-            wks = False
-        elif move.piece_moved == 'bK':
-            bqs = False
-            bks = False
-        elif move.piece_moved == 'wR':
-            if wqs and move.start_sq == (len(self.board) - 1, 0): # white queen side rook
-                wqs = False
-            elif wks and move.start_sq == (len(self.board) - 1, len(self.board[0]) - 1): # white king side rook
-                wks = False
-        elif move.piece_moved == 'bR':
-            if bqs and move.start_sq == (0, 0): # black queen side rook
-                bqs = False
-            elif bks and move.start_sq == (0, len(self.board[0]) - 1): # black king side rook    
-                bks = False
-        
-        # no castling if rooks are captured      
-        if move.piece_captured == 'wR':
-            if move.end_sq == (len(self.board) - 1, 0):
-                wqs = False
-            elif move.end_sq == (len(self.board) - 1, len(self.board[0]) - 1):
-                wks = False
-        elif move.piece_captured == 'bR':
-            if move.end_sq == (0, 0):
-                bqs = False
-            if move.end_sq == (0, len(self.board[0]) - 1):
-                bks = False      
-        self.castle_rights = (wqs, wks, bqs, bks)
-        self.castle_rights_log.append(self.castle_rights)
-        
-        # update move number
-        if self.white_to_move:
-            self.fullmoves += 1
-        
-        # update consecutive halfmoves
-        if move.piece_captured == '--' and not move.piece_moved.endswith('P'):
-            self.halfmoves += 1
-        else:
-            self.halfmove_log.append(self.halfmoves) # log for undoing moves
-            self.halfmoves = 0
-        
-        # draw
-        if self.halfmoves == 50:
-            self.stalemate = True
+        undo_log = self.undo_log
+        move = undo_log.pop()
+        self.undo_log = [] # make_move clears the undo log, keep the remaining undone moves for further redos
+        self.make_move(move)
+        self.undo_log = undo_log
             
     def get_pawn_moves(self, r: int, c: int) -> list:
         '''Return all possible moves for a pawn based on position and color (not considering opening king checks)'''
@@ -280,36 +483,37 @@ class GameState():
         pawn_moves = []
         if self.white_to_move:
             d = -1
+            my_color = 'w'
             opp_color = 'b'
             prom_row = 0
         else:
             d = 1
+            my_color = 'b'
             opp_color = 'w'
             prom_row = len(self.board) - 1
 
-        if r != prom_row: # to avoid index out of range, pawns can't be on edge row
-            if  c > 0 and self.board[r + d * 1][c - 1].startswith(opp_color): # take to the left
-                if r + d * 1 == prom_row:               
-                    pawn_moves.append(Move((r, c), (r + d * 1, c - 1), self, is_promotion=True)) # take to the left
-                else:
-                    pawn_moves.append(Move((r, c), (r + d * 1, c - 1), self))
-            if c < len(self.board[0]) - 1 and self.board[r + d * 1][c + 1].startswith(opp_color): # take to the right
-                if r + d * 1 == prom_row:             
-                    pawn_moves.append(Move((r, c), (r + d * 1, c + 1), self, is_promotion=True))
-                else:
-                    pawn_moves.append(Move((r, c), (r + d * 1, c + 1), self))
+        if r != prom_row: # pawns can't be on edge row
+            sq = r * 8 + c
+            is_promotion = r + d * 1 == prom_row
+            attacks = PAWN_ATTACKS[my_color][sq]
+            captures = attacks & self.occupancy[opp_color] # take to the left and to the right
+            promotions = 'QRBN' if is_promotion else 'Q'
+            while captures:
+                lsb = captures & -captures
+                for promotion in promotions:
+                    pawn_moves.append(Move((r, c), SQUARES[lsb.bit_length() - 1], self, is_promotion=is_promotion, promotion=promotion))
+                captures ^= lsb
         
             if self.enpassant_possible: 
                 ep_row, ep_col = self.enpassant_possible
-                if r == ep_row - d * 1 and (c == ep_col - 1 or c == ep_col + 1):
+                if attacks & SQUARE_BB[ep_row * 8 + ep_col]:
                     pawn_moves.append(Move((r, c), (ep_row, ep_col), self, is_enpassant=True)) # en passant
-                    
-            if self.board[r + d * 1] [c] == '--': 
-                if r + d * 1 == prom_row:   
-                    pawn_moves.append(Move((r, c), (r + d * 1, c), self, is_promotion=True)) # move forward one square
-                else:
-                    pawn_moves.append(Move((r, c), (r + d * 1, c), self)) # move forward one square
-                if r == (len(self.board) - 1) - prom_row + d * 1 and self.board[r + d * 2][c] == '--': # first condition checking if pawn is on starting row (1 for black, 6 for white)
+            
+            empty = ~(self.occupancy['w'] | self.occupancy['b'])
+            if SQUARE_BB[sq + d * 8] & empty:
+                for promotion in promotions:
+                    pawn_moves.append(Move((r, c), (r + d * 1, c), self, is_promotion=is_promotion, promotion=promotion)) # move forward one square
+                if r == (len(self.board) - 1) - prom_row + d * 1 and SQUARE_BB[sq + d * 16] & empty: # first condition checking if pawn is on starting row (1 for black, 6 for white)
                     pawn_moves.append(Move((r, c), (r + d * 2, c), self)) # move forward 2 squares
         
         return pawn_moves
@@ -317,89 +521,51 @@ class GameState():
     def get_rook_moves(self, r: int, c: int) -> list:
         '''Return all possible moves for a rook based on position and color (not considering opening king checks)'''
         
-        rook_moves = []
         my_color = self.get_piece((r, c))[0] # get color of moving rook
-        move_vectors = [(-1, 0), (0, 1), (1, 0), (0, -1)] # possible move directions
-        
-        for v in move_vectors:
-            for i in range(1, 8):
-                row = r + v[0] * i
-                col = c + v[1] * i
-                if (row < 0) or (row >= len(self.board)) or (col < 0) or (col >= len(self.board[0])): # out of board bounds
-                    break  
-                color = self.get_piece((row, col))[0]
-                if color == my_color: # stop if we reach same colored piece
-                    break
-                rook_moves.append(Move((r, c), (row, col), self))
-                if color != '-': # stop if we reach opposite colored piece but add this cell
-                    break    
-        return rook_moves
+        targets = rook_attacks(r * 8 + c, self.occupancy['w'] | self.occupancy['b']) & ~self.occupancy[my_color]
+        return self.get_moves_to_targets(r, c, targets)
     
     def get_knight_moves(self, r: int, c: int) -> list:
         '''Return all possible moves for a knight based on position and color (not considering opening king checks)'''
         
-        knight_moves = []
         my_color = self.get_piece((r, c))[0] # get color of moving knight
-        move_vectors = [(-1, -2), (-1, 2), (1, -2), (1, 2), (-2, -1), (-2, 1), (2, -1), (2, 1)] # possible move directions
-        
-        for v in move_vectors:
-            row = r + v[0]
-            col = c + v[1]
-            if (row < 0) or (row >= len(self.board)) or (col < 0) or (col >= len(self.board[0])): # out of board bounds
-                continue  
-            color = self.get_piece((row, col))[0]
-            if color != my_color: # stop if we reach same colored piece
-                knight_moves.append(Move((r, c), (row, col), self))
-
-        return knight_moves
+        targets = KNIGHT_ATTACKS[r * 8 + c] & ~self.occupancy[my_color]
+        return self.get_moves_to_targets(r, c, targets)
         
     def get_bishop_moves(self, r: int, c: int) -> list:
         '''Return all possible moves for a bishop based on position and color (not considering opening king checks)'''
         
-        bishop_moves = []
         my_color = self.get_piece((r, c))[0] # get color of moving bishop
-        move_vectors = [(-1, -1), (-1, 1), (1, -1), (1, 1)] # possible move directions
-        
-        for v in move_vectors:
-            for i in range(1, 8):
-                row = r + v[0] * i
-                col = c + v[1] * i
-                if (row < 0) or (row >= len(self.board)) or (col < 0) or (col >= len(self.board[0])): # out of board bounds
-                    break  
-                color = self.get_piece((row, col))[0]
-                if color == my_color: # stop if we reach same colored piece
-                    break
-                bishop_moves.append(Move((r, c), (row, col), self))
-                if color != '-': # stop if we reach opposite colored piece but add this cell
-                    break    
-        return bishop_moves
+        targets = bishop_attacks(r * 8 + c, self.occupancy['w'] | self.occupancy['b']) & ~self.occupancy[my_color]
+        return self.get_moves_to_targets(r, c, targets)
 
     def get_queen_moves(self, r: int, c: int) -> list:
         '''Return all possible moves for a queen based on position and color (not considering opening king checks)'''
         
-        queen_moves = self.get_bishop_moves(r, c) + self.get_rook_moves(r, c)
-        return queen_moves        
+        my_color = self.get_piece((r, c))[0] # get color of moving queen
+        targets = queen_attacks(r * 8 + c, self.occupancy['w'] | self.occupancy['b']) & ~self.occupancy[my_color]
+        return self.get_moves_to_targets(r, c, targets)
 
     def get_king_moves(self, r: int, c: int) -> list:
         '''Return all possible moves for a king based on position and color (not considering opening king checks)'''
         
-        king_moves = []
         my_color = self.get_piece((r, c))[0] # get color of moving king
-        move_vectors = [(-1, -1), (-1, 1), (1, -1), (1, 1), (-1, 0), (0, 1), (1, 0), (0, -1)] # possible move directions
-        
-        for v in move_vectors:
-            row = r + v[0]
-            col = c + v[1]
-            if (row < 0) or (row >= len(self.board)) or (col < 0) or (col >= len(self.board[0])): # out of board bounds
-                continue  
-            color = self.get_piece((row, col))[0]
-            if color != my_color: # stop if we reach same colored piece
-                king_moves.append(Move((r, c), (row, col), self))
-
+        targets = KING_ATTACKS[r * 8 + c] & ~self.occupancy[my_color]
+        king_moves = self.get_moves_to_targets(r, c, targets)
         king_moves.extend(self.get_castle_moves(r, c, my_color)) # add castling
         
         return king_moves
     
+    def get_moves_to_targets(self, r: int, c: int, targets: int) -> list:
+        '''Return moves from square (r, c) to every square set in the targets bitboard'''
+        
+        moves = []
+        while targets:
+            lsb = targets & -targets # lowest set bit
+            moves.append(Move((r, c), SQUARES[lsb.bit_length() - 1], self))
+            targets ^= lsb
+        return moves
+    
     def get_castle_moves(self, r, c, my_color) -> list:
         '''Generates possible castling moves'''
         
@@ -407,203 +573,482 @@ class GameState():
         
         if self.in_check():
             return castle_moves # can't castle if in check
+        attacked = self.get_attack_map('b' if my_color == 'w' else 'w')
         
         if (my_color == 'w' and self.castle_rights[0]) or (my_color == 'b' and self.castle_rights[2]): # can only castle if you haven't lost castling rights
-            castle_moves.extend(self.get_qs_castle_moves(r, c, my_color)) 
+            castle_moves.extend(self.get_qs_castle_moves(r, c, attacked)) 
                   
         if (my_color == 'w' and self.castle_rights[1]) or (my_color == 'b' and self.castle_rights[3]): # can only castle if you haven't lost castling rights
-            castle_moves.extend(self.get_ks_castle_moves(r, c, my_color))                    
+            castle_moves.extend(self.get_ks_castle_moves(r, c, attacked))                    
         
         return castle_moves 
     
-    def get_ks_castle_moves(self, r, c, my_color) -> list:
+    def get_ks_castle_moves(self, r, c, attacked: int) -> list:
+        '''King side castling if the squares between king and rook are empty, attacked is the opponent's attack map'''
         
         ks_castle_moves = []
         
         if self.board[r][c + 1] == '--' and self.board[r][c + 2] == '--': # check that space is empty between king and rook    
-            # only checking that intermediate square is in check, because final position is checked in get_valid_moves
-            self.remove_piece((r, c)) 
-            self.add_piece((r, c + 1), my_color + 'K') # moving king 1 square over
-            in_check = self.in_check()
-            self.remove_piece((r, c + 1))
-            self.add_piece((r, c), my_color + 'K') # reverting position
-            if not in_check:
+            # only checking that intermediate square is attacked, because final position is checked in get_valid_moves
+            if not attacked & SQUARE_BB[r * 8 + c + 1]:
                 ks_castle_moves.append(Move((r, c), (r, c + 2), self, is_castling=True))
             
         return ks_castle_moves
       
-    def get_qs_castle_moves(self, r, c, my_color) -> list:
+    def get_qs_castle_moves(self, r, c, attacked: int) -> list:
+        '''Queen side castling if the squares between king and rook are empty, attacked is the opponent's attack map'''
         
         qs_castle_moves = []
         
         if self.board[r][c - 1] == '--' and self.board[r][c - 2] == '--' and self.board[r][c - 3] == '--': # check that space is empty between king and rook
-            # only checking that intermediate square is in check, because final position is checked in get_valid_moves
-            self.remove_piece((r, c)) 
-            self.add_piece((r, c - 1), my_color + 'K') # moving king 1 square over
-            in_check = self.in_check()
-            self.remove_piece((r, c - 1))
-            self.add_piece((r, c), my_color + 'K') # reverting position
-            if not in_check:
+            # only checking that intermediate square is attacked, because final position is checked in get_valid_moves
+            if not attacked & SQUARE_BB[r * 8 + c - 1]:
                 qs_castle_moves.append(Move((r, c), (r, c - 2), self, is_castling=True))
         
         return qs_castle_moves
                
     def get_all_moves(self) -> list:
         '''All moves in current position without considering opening king to checks'''
-        # does not include castling, it goes straight to valid moves as checks have already been made
+        # walks the bitboards of the side to move instead of scanning every square of the board
            
         all_moves = []
-        for r in range(len(self.board)):
-            for c in range(len(self.board[r])):
-                colored_piece = self.get_piece((r,c))
-                if colored_piece == '--': # skip empty cells
-                    continue
-                color, piece = colored_piece[0], colored_piece[1] # separate color and piece itself
-                turn = 'w' if self.white_to_move else 'b'
-                if color == turn: # only process cells with relevant color of pieces
-                    moves = self.move_functions[piece](r, c) # call appropriate function based on the piece
-                    all_moves.extend(moves)                               
+        turn = 'w' if self.white_to_move else 'b'
+        for piece, move_function in self.move_functions.items():
+            pieces = self.bitboards[turn + piece]
+            while pieces:
+                lsb = pieces & -pieces
+                all_moves.extend(move_function(*SQUARES[lsb.bit_length() - 1])) # call appropriate function based on the piece
+                pieces ^= lsb
         return all_moves
     
     def get_valid_moves(self) -> list:
         '''All available moves in current position that are allowed by chess rules'''
         
-        valid_moves = []
-        temp_undo_log = copy.deepcopy(self.undo_log) # save undo log state
-        temp_stalemate = self.stalemate # save stalemate state
-        
-        for move in self.get_all_moves(): # go through all possible moves
-            self.make_move(move) # make a test move
-            self.white_to_move = not self.white_to_move # switch turn back to original player
-            if not self.in_check():
-                valid_moves.append(move)
-            self.white_to_move = not self.white_to_move # switch turns back before undoing move 
-            self.undo_last_move() # revert test move
-                
-        self.undo_log = temp_undo_log # restore undo log
-        self.stalemate = temp_stalemate # restore stalemate
+        valid_moves = self.get_legal_moves()
         
         if len(valid_moves) == 0: # if no moves - either it's checkmate or stalemate
             if self.in_check() == True:
                 self.checkmate = True
             else:
                 self.stalemate = True
+                self.draw_reason = 'stalemate'
+        elif self.halfmoves >= 100: # checkmate on the hundredth half move still counts, so only checked when there are moves
+            self.draw_reason = 'fifty-move rule'
+        elif self.is_repetition(3):
+            self.draw_reason = 'threefold repetition'
                                 
         return valid_moves
-              
-    def in_check(self):
-        ''' Validating check without generating opponent's moves'''
+    
+    def is_repetition(self, count: int = 2) -> bool:
+        '''
+        Has the current position occurred count times (this time included)? Compares Zobrist keys of earlier positions
+        with the same side to move, only back to the last capture or pawn move as no position before it can come again
+        '''
+        
+        state_stack = self.state_stack
+        reversible = min(self.halfmoves, len(state_stack))
+        if reversible < 4: # a position needs at least 4 half moves to come back
+            return False
+        key = self.zobrist_key
+        seen = 1
+        for i in range(len(state_stack) - 2, len(state_stack) - reversible - 1, -2):
+            if state_stack[i][3] == key:
+                seen += 1
+                if seen >= count:
+                    return True
+        return False
+    
+    def is_fifty_move_draw(self) -> bool:
+        '''100 half moves without captures or pawn moves, unless the side to move is checkmated'''
+        
+        return self.halfmoves >= 100 and not (self.in_check() and not self.get_legal_moves())
+    
+    def get_move_from_uci(self, notation: str):
+        '''Legal move matching long algebraic notation (e2e4, e1g1, e7e8q), raises ValueError if there is none'''
+        
+        if len(notation) in (4, 5) and notation[0] in Move.files_to_cols and notation[1] in Move.ranks_to_rows:
+            start = Move.ranks_to_rows[notation[1]] * 8 + Move.files_to_cols[notation[0]]
+            for move in self.get_legal_moves(from_mask=SQUARE_BB[start]):
+                if move.get_uci_notation() == notation:
+                    return move
+        raise ValueError(f'Illegal move: {notation!r}')
+    
+    def get_capture_moves(self) -> list:
+        '''Legal captures (en passant included) and promotions only, quiet moves are never built'''
+        
+        return self.get_legal_moves(quiets=False)
+    
+    def get_quiet_moves(self) -> list:
+        '''Legal moves that are neither captures nor promotions (castling included)'''
         
+        return self.get_legal_moves(captures=False)
+    
+    def get_check_info(self) -> tuple[int, int, int, int]:
+        '''
+        Everything legality depends on, computed once per position and shared by all stages of move generation:
+        (king square, checkers, pinned pieces, squares attacked by the opponent with our king removed).
+        Cached until the position changes
+        '''
+        
+        check_info = self.attack_cache.get('check_info')
+        if check_info is not None:
+            return check_info
         if self.white_to_move:
             my_color = 'w'
             opp_color = 'b'
-            for i in range(len(self.board)): 
-                for j in range(len(self.board[0])):
-                    if self.board[i][j] == 'wK': # finding white king square
-                        r, c = i, j
-                        break
-
         else:
             my_color = 'b'
             opp_color = 'w'
-            for i in range(len(self.board)):
-                for j in range(len(self.board[0])):
-                    if self.board[i][j] == 'bK': # finding black king square
-                        r, c = i, j
-                        break            
-
         
-        move_vectors = [(-1, -1), (-1, 1), (1, -1), (1, 1), (-1, 0), (0, 1), (1, 0), (0, -1)]
-        knight_moves = [(-1, -2), (-1, 2), (1, -2), (1, 2), (-2, -1), (-2, 1), (2, -1), (2, 1)]
-        
-        for j, v in enumerate(move_vectors):
-            for i in range(1, 8):
-                row = r + v[0] * i
-                col = c + v[1] * i
-                if (row < 0) or (row >= len(self.board)) or (col < 0) or (col >= len(self.board[0])): # out of board bounds
-                    break  
-                colored_piece = self.get_piece((row, col))
-                color = colored_piece[0]
-                piece = colored_piece[1]
-                if color == my_color: # if closest piece is same color - no check
-                    break
-                if color == opp_color: 
-                    if piece =='Q': # queen checks
-                        return True
-                    elif 0 <= j <= 3 and piece == 'B': # bishop checks
-                        return True
-                    elif 4 <= j <= 7 and piece == 'R': # rook checks
-                        return True
-                    elif i == 1 and my_color == 'w' and 0 <= j <= 1 and piece == 'P': # pawn checks for white
-                        return True
-                    elif i == 1 and my_color == 'b' and 2 <= j <= 3 and piece == 'P': # pawn checks for black
-                        return True
-                    elif i == 1 and piece == 'K': # not actually a check, but needed so that kings can't walk into each other
-                        return True
-                    break # stop looking at a vector after finding one opponent's piece
-        
-        for move in knight_moves:
-            row = r + move[0]
-            col = c + move[1]
-            if (row < 0) or (row >= len(self.board)) or (col < 0) or (col >= len(self.board[0])): # out of board bounds
-                continue
-            colored_piece = self.get_piece((row, col))
-            color = colored_piece[0]
-            piece = colored_piece[1]
-            if color == opp_color and piece == 'N':
-                return True
+        bb = self.bitboards
+        own = self.occupancy[my_color]
+        occupied = own | self.occupancy[opp_color]
+        king = bb[my_color + 'K']
+        king_sq = king.bit_length() - 1
+        opp_rooks = bb[opp_color + 'R'] | bb[opp_color + 'Q'] # pieces attacking along ranks and files
+        opp_bishops = bb[opp_color + 'B'] | bb[opp_color + 'Q'] # pieces attacking along diagonals
+        
+        checkers = ((PAWN_ATTACKS[my_color][king_sq] & bb[opp_color + 'P']) 
+                    | (KNIGHT_ATTACKS[king_sq] & bb[opp_color + 'N'])
+                    | (rook_attacks(king_sq, occupied) & opp_rooks)
+                    | (bishop_attacks(king_sq, occupied) & opp_bishops))
+        danger = self.get_attacked_squares(opp_color, occupied ^ king) # remove the king so it can't step back along a checking ray
+        
+        # pinned pieces - our only piece standing between the king and an opponent's slider
+        pinned = 0
+        snipers = (rook_attacks(king_sq, 0) & opp_rooks) | (bishop_attacks(king_sq, 0) & opp_bishops)
+        while snipers:
+            lsb = snipers & -snipers
+            blockers = BETWEEN[king_sq][lsb.bit_length() - 1] & occupied
+            if blockers & own and not blockers & (blockers - 1):
+                pinned |= blockers
+            snipers ^= lsb
+        
+        check_info = self.attack_cache['check_info'] = (king_sq, checkers, pinned, danger)
+        return check_info
+    
+    def get_legal_moves(self, captures: bool = True, quiets: bool = True, from_mask: int = FULL_BOARD, check_info: tuple = None) -> list:
+        '''
+        Generates only legal moves, without making test moves on the board:
+         - checkers, pinned pieces and squares attacked by the opponent come from get_check_info
+         - in double check only the king moves, in single check other pieces can only capture or block the checker
+         - pinned pieces can only move along the line between the king and the pinning piece
+         - captures (with promotions and en passant) and quiet moves can be generated separately
+         - only pieces standing on squares set in from_mask are moved
+        '''
+        
+        if self.white_to_move:
+            my_color = 'w'
+            opp_color = 'b'
+            push = -8 # pawn step forward in square indices
+            start_row = 6
+            prom_row = 0
+        else:
+            my_color = 'b'
+            opp_color = 'w'
+            push = 8
+            start_row = 1
+            prom_row = 7
+        
+        if check_info is None:
+            check_info = self.get_check_info()
+        king_sq, checkers, pinned, danger = check_info
+        
+        bb = self.bitboards
+        own = self.occupancy[my_color]
+        enemy = self.occupancy[opp_color]
+        occupied = own | enemy
+        empty = FULL_BOARD ^ occupied
+        destinations = (enemy if captures else 0) | (empty if quiets else 0) # squares pieces are allowed to move to
+        
+        legal_moves = []
+        
+        # king moves
+        if from_mask & SQUARE_BB[king_sq]:
+            king_start = SQUARES[king_sq]
+            targets = KING_ATTACKS[king_sq] & destinations & ~danger
+            while targets:
+                lsb = targets & -targets
+                legal_moves.append(Move(king_start, SQUARES[lsb.bit_length() - 1], self))
+                targets ^= lsb
+            
+            if quiets and not checkers:
+                # castling, squares the king passes and lands on can't be attacked
+                qs_castle, ks_castle = self.castle_rights[0:2] if my_color == 'w' else self.castle_rights[2:4]
+                if qs_castle and not occupied & (SQUARE_BB[king_sq - 1] | SQUARE_BB[king_sq - 2] | SQUARE_BB[king_sq - 3]) \
+                        and not danger & (SQUARE_BB[king_sq - 1] | SQUARE_BB[king_sq - 2]):
+                    legal_moves.append(Move(king_start, SQUARES[king_sq - 2], self, is_castling=True))
+                if ks_castle and not occupied & (SQUARE_BB[king_sq + 1] | SQUARE_BB[king_sq + 2]) \
+                        and not danger & (SQUARE_BB[king_sq + 1] | SQUARE_BB[king_sq + 2]):
+                    legal_moves.append(Move(king_start, SQUARES[king_sq + 2], self, is_castling=True))
+        
+        if checkers & (checkers - 1): # double check, only the king can move
+            return legal_moves
+        
+        if checkers:
+            check_mask = checkers | BETWEEN[king_sq][checkers.bit_length() - 1] # capture the checker or block the check
+        else:
+            check_mask = FULL_BOARD
+        
+        # knights, pinned knights can never move
+        pieces = bb[my_color + 'N'] & ~pinned & from_mask
+        while pieces:
+            lsb = pieces & -pieces
+            sq = lsb.bit_length() - 1
+            start = SQUARES[sq]
+            targets = KNIGHT_ATTACKS[sq] & destinations & check_mask
+            while targets:
+                target = targets & -targets
+                legal_moves.append(Move(start, SQUARES[target.bit_length() - 1], self))
+                targets ^= target
+            pieces ^= lsb
+        
+        # sliders
+        for piece, attacks in (('B', bishop_attacks), ('R', rook_attacks), ('Q', queen_attacks)):
+            pieces = bb[my_color + piece] & from_mask
+            while pieces:
+                lsb = pieces & -pieces
+                sq = lsb.bit_length() - 1
+                start = SQUARES[sq]
+                targets = attacks(sq, occupied) & destinations & check_mask
+                if lsb & pinned:
+                    targets &= LINE[king_sq][sq]
+                while targets:
+                    target = targets & -targets
+                    legal_moves.append(Move(start, SQUARES[target.bit_length() - 1], self))
+                    targets ^= target
+                pieces ^= lsb
+        
+        # pawns, promotions are generated with captures
+        pieces = bb[my_color + 'P'] & from_mask
+        while pieces:
+            lsb = pieces & -pieces
+            sq = lsb.bit_length() - 1
+            start = SQUARES[sq]
+            targets = PAWN_ATTACKS[my_color][sq] & enemy if captures else 0
+            is_promotion = (sq + push) >> 3 == prom_row
+            if (captures if is_promotion else quiets) and SQUARE_BB[sq + push] & empty:
+                targets |= SQUARE_BB[sq + push] # move forward one square
+                if sq >> 3 == start_row and SQUARE_BB[sq + 2 * push] & empty:
+                    targets |= SQUARE_BB[sq + 2 * push] # move forward 2 squares
+            targets &= check_mask
+            if lsb & pinned:
+                targets &= LINE[king_sq][sq]
+            while targets:
+                target = targets & -targets
+                if is_promotion:
+                    for promotion in 'QRBN':
+                        legal_moves.append(Move(start, SQUARES[target.bit_length() - 1], self, is_promotion=True, promotion=promotion))
+                else:
+                    legal_moves.append(Move(start, SQUARES[target.bit_length() - 1], self))
+                targets ^= target
+            pieces ^= lsb
+        
+        # en passant
+        if captures and self.enpassant_possible:
+            ep_sq = self.enpassant_possible[0] * 8 + self.enpassant_possible[1]
+            captured = SQUARE_BB[ep_sq - push] # pawn that has just moved 2 squares
+            if check_mask & (SQUARE_BB[ep_sq] | captured):
+                pieces = PAWN_ATTACKS[opp_color][ep_sq] & bb[my_color + 'P'] & from_mask # our pawns attacking en passant square
+                opp_rooks = bb[opp_color + 'R'] | bb[opp_color + 'Q']
+                opp_bishops = bb[opp_color + 'B'] | bb[opp_color + 'Q']
+                while pieces:
+                    lsb = pieces & -pieces
+                    # two pawns leave the same rank at once, so test the king against sliders on the resulting board
+                    after = occupied ^ lsb ^ captured ^ SQUARE_BB[ep_sq]
+                    if not (rook_attacks(king_sq, after) & opp_rooks) and not (bishop_attacks(king_sq, after) & opp_bishops):
+                        legal_moves.append(Move(SQUARES[lsb.bit_length() - 1], self.enpassant_possible, self, is_enpassant=True))
+                    pieces ^= lsb
+        
+        return legal_moves
+    
+    def get_attacked_squares(self, color: str, occupied: int = None) -> int:
+        '''Bitboard of all squares attacked by pieces of specified color, sliders are blocked by occupied squares'''
         
+        if occupied is None:
+            occupied = self.occupancy['w'] | self.occupancy['b']
+        bb = self.bitboards
+        
+        pawns = bb[color + 'P']
+        if color == 'w':
+            attacked = ((pawns & ~FILE_A) >> 9) | ((pawns & ~FILE_H) >> 7)
+        else:
+            attacked = (((pawns & ~FILE_A) << 7) | ((pawns & ~FILE_H) << 9)) & FULL_BOARD
+        
+        attacked |= KING_ATTACKS[bb[color + 'K'].bit_length() - 1]
+        pieces = bb[color + 'N']
+        while pieces:
+            lsb = pieces & -pieces
+            attacked |= KNIGHT_ATTACKS[lsb.bit_length() - 1]
+            pieces ^= lsb
+        for piece, attacks in (('B', bishop_attacks), ('R', rook_attacks), ('Q', queen_attacks)):
+            pieces = bb[color + piece]
+            while pieces:
+                lsb = pieces & -pieces
+                attacked |= attacks(lsb.bit_length() - 1, occupied)
+                pieces ^= lsb
+        return attacked
+    
+    def get_attack_map(self, color: str) -> int:
+        '''Bitboard of squares attacked by color in the current position, cached until the position changes'''
+        
+        attacked = self.attack_cache.get(color)
+        if attacked is None:
+            attacked = self.attack_cache[color] = self.get_attacked_squares(color)
+        return attacked
+              
+    def in_check(self) -> bool:
+        '''Validating check without generating opponent's moves, answered from cached check info or attack map if there is one'''
+        
+        cache = self.attack_cache
+        if cache:
+            check_info = cache.get('check_info')
+            if check_info is not None:
+                return check_info[1] != 0
+            opp_attacks = cache.get('b' if self.white_to_move else 'w')
+            if opp_attacks is not None:
+                return opp_attacks & self.bitboards['wK' if self.white_to_move else 'bK'] != 0
+        if self.white_to_move:
+            king = self.bitboards['wK']
+            opp_color = 'b'
+        else:
+            king = self.bitboards['bK']
+            opp_color = 'w'
+        return self.is_square_attacked(king.bit_length() - 1, opp_color)
+    
+    def is_square_attacked(self, sq: int, by_color: str) -> bool:
+        '''Check if square (bitboard index) is attacked by any piece of specified color, using attack tables'''
+        
+        bb = self.bitboards
+        my_color = 'b' if by_color == 'w' else 'w'
+        if PAWN_ATTACKS[my_color][sq] & bb[by_color + 'P']: # pawns attacking the square stand where our pawn would attack from it
+            return True
+        if KNIGHT_ATTACKS[sq] & bb[by_color + 'N']:
+            return True
+        if KING_ATTACKS[sq] & bb[by_color + 'K']: # not actually a check, but needed so that kings can't walk into each other
+            return True
+        occupied = self.occupancy['w'] | self.occupancy['b']
+        queens = bb[by_color + 'Q']
+        if rook_attacks(sq, occupied) & (bb[by_color + 'R'] | queens):
+            return True
+        if bishop_attacks(sq, occupied) & (bb[by_color + 'B'] | queens):
+            return True
         return False
                          
         
+def _flag_property(flag: int, doc: str) -> property:
+    '''Boolean attribute stored as a bit of Move.flags'''
+    
+    def getter(self) -> bool:
+        return bool(self.flags & flag)
+    
+    def setter(self, value: bool) -> None:
+        if value:
+            self.flags |= flag
+        else:
+            self.flags &= ~flag
+    
+    return property(getter, setter, doc=doc)
+
 
 class Move():
     '''
     Class provides information on a chess move in a given game state:
      - starting and destination squares
      - moved and captured piece ('--' if none)
-     - chess notation
+     - en passant/castling/promotion and check flags
+     - chess notation, only built when asked for
+    Moves are created by the million during search, so they are kept small: no instance dict, flags packed in one int
+    and a packed integer code (start square << 6 | end square | promotion piece << 12) used for equality, hashing
+    and storing moves in tables. 0 is never a move code (a8 to a8).
     '''
     
+    __slots__ = ('code', 'flags', 'start_sq', 'end_sq', 'piece_moved', 'piece_captured')
+    
     ranks_to_rows = {'1': 7, '2': 6, '3': 5, '4': 4, '5': 3, '6': 2, '7': 1, '8': 0}
     rows_to_ranks = {v: k for k, v in ranks_to_rows.items()}
     files_to_cols = {'a': 0, 'b': 1, 'c': 2, 'd': 3, 'e': 4, 'f': 5, 'g': 6, 'h': 7}
     cols_to_files = {v: k for k, v in files_to_cols.items()}
     
-    def __init__(self, start_sq: tuple[int, int], end_sq: tuple[int, int], gs: GameState, is_enpassant = False, is_promotion = False, is_castling = False):
+    def __init__(self, start_sq: tuple[int, int], end_sq: tuple[int, int], gs: GameState, is_enpassant = False, is_promotion = False, is_castling = False, promotion = 'Q'):
+        '''Build move from (row, col) squares, e.g. the two squares clicked in the GUI. promotion is the piece letter (Q, R, B, N)'''
+        
         self.start_sq = start_sq
         self.end_sq = end_sq
-        self.start_row = start_sq[0]
-        self.start_col = start_sq[1]
-        self.end_row = end_sq[0]
-        self.end_col = end_sq[1]
-        self.is_enpassant = is_enpassant
-        self.piece_moved = gs.get_piece(self.start_sq)
-        if self.is_enpassant:
+        self.code = (start_sq[0] * 8 + start_sq[1]) << 6 | (end_sq[0] * 8 + end_sq[1])
+        if is_promotion:
+            self.code |= PROMOTION_CODES[promotion] << 12 # queen by default
+        self.flags = (ENPASSANT if is_enpassant else 0) | (CASTLING if is_castling else 0)
+        self.piece_moved = gs.board[start_sq[0]][start_sq[1]]
+        if is_enpassant:
             self.piece_captured = 'bP' if self.piece_moved == 'wP' else 'wP' # special case for en passant because we're moving to empty square
         else:
-            self.piece_captured = gs.get_piece(self.end_sq)
-        self.is_promotion = is_promotion
-        self.promotion_piece = self.piece_moved[0] + 'Q' # default to queen just in case
-        self.is_castling = is_castling
-        self.is_checkmate = False
-        self.is_stalemate = False
-        self.is_check = False
-        
+            self.piece_captured = gs.board[end_sq[0]][end_sq[1]]
+    
+    is_enpassant = _flag_property(ENPASSANT, 'Pawn captures en passant')
+    is_castling = _flag_property(CASTLING, 'King castles, start and end squares are the king\'s')
+    is_check = _flag_property(CHECK, 'Move gives check, set after the move is played (for notation)')
+    is_checkmate = _flag_property(CHECKMATE, 'Move gives checkmate, set after the move is played (for notation)')
+    is_stalemate = _flag_property(STALEMATE, 'Move ends the game in a draw, set after the move is played (for notation)')
+    
+    @property
+    def is_promotion(self) -> bool:
+        return self.code >= 4096
+    
+    @is_promotion.setter
+    def is_promotion(self, value: bool) -> None:
+        if not value:
+            self.code &= 4095
+        elif self.code < 4096:
+            self.code |= 1 << 12 # queen
+    
+    @property
+    def promotion_piece(self) -> str:
+        return self.piece_moved[0] + (PROMOTION_PIECES[self.code >> 12] or 'Q')
+    
+    @promotion_piece.setter
+    def promotion_piece(self, piece: str) -> None:
+        if self.code >= 4096: # only promotions keep the piece, so codes of other moves don't change
+            self.code = self.code & 4095 | PROMOTION_CODES[piece[1]] << 12
+    
+    @property
+    def start_row(self) -> int:
+        return self.start_sq[0]
+    
+    @property
+    def start_col(self) -> int:
+        return self.start_sq[1]
+    
+    @property
+    def end_row(self) -> int:
+        return self.end_sq[0]
+    
+    @property
+    def end_col(self) -> int:
+        return self.end_sq[1]
     
     def __eq__(self, other):
-        '''Overrides the default implementation'''
+        '''Moves are equal if they have the same code: same start and end squares and, for promotions, the same piece'''
         
         if isinstance(other, Move):
-            return (self.start_sq == other.start_sq) and (self.end_sq == other.end_sq)
+            return self.code == other.code
         return NotImplemented
     
     def __hash__(self):
-        '''Overrides the default implementation'''
+        '''Consistent with __eq__'''
         
-        return hash(tuple(sorted(self.__dict__.items()))) 
+        return self.code
+    
+    def __getstate__(self):
+        '''Compact state for pickling, moves are sent between processes'''
         
+        return self.code, self.flags, self.start_sq, self.end_sq, self.piece_moved, self.piece_captured
     
+    def __setstate__(self, state):
+        '''Restore state saved by __getstate__'''
+        
+        self.code, self.flags, self.start_sq, self.end_sq, self.piece_moved, self.piece_captured = state
+        
     def get_chess_notation(self) -> str:
         '''
         Returns move description in FIDE standard algebraic notation
@@ -635,6 +1080,14 @@ class Move():
             notation += '+'
         return notation
     
+    def get_uci_notation(self) -> str:
+        '''Returns move in long algebraic notation used by UCI and perft tools: e2e4, e1g1 (castling), e7e8q'''
+        
+        notation = self.get_rank_file(self.start_sq) + self.get_rank_file(self.end_sq)
+        if self.code >= 4096: # promotion
+            notation += PROMOTION_PIECES[self.code >> 12].lower()
+        return notation
+    
     def get_rank_file(self, square: tuple[int, int]) -> str:
         '''
         Convert indices for specified square from matrix coords to rank and file chess notation (1-8, a-h)
@@ -642,7 +1095,27 @@ class Move():
         '''
         
         return self.cols_to_files[square[1]] + self.rows_to_ranks[square[0]]
-        
+
+
+def read_fen_file(path: str, skip_invalid: bool = False) -> Iterator[GameState]:
+    '''
+    Streams positions from a file with one FEN per line, without reading the whole file into memory.
+    Blank lines and lines starting with # are skipped, anything after ';' is ignored (EPD style annotations).
+    Invalid lines raise ValueError (with line number) unless skip_invalid is set
+    '''
+    
+    with open(path, buffering=1 << 20) as file:
+        for line_number, line in enumerate(file, 1):
+            fen = line.split(';', 1)[0].strip()
+            if not fen or fen[0] == '#':
+                continue
+            try:
+                yield GameState(fen)
+            except ValueError as error:
+                if not skip_invalid:
+                    raise ValueError(f'{path}:{line_number}: {error}') from None
+
+
 if __name__ == '__main__':
     test = GameState()
     test_2 = test
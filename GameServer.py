@@ -0,0 +1,358 @@
+'''
+Asyncio game server: many concurrent games held in memory, AI moves searched on a bounded process pool.
+
+Protocol: JSON over TCP, one object per line in both directions. Every request has an "op" and may carry an "id",
+which is copied to its response. Requests of one connection are handled concurrently, so responses can come back
+in a different order than the requests were sent.
+    {"op": "new_game", "fen": <optional FEN>}                     -> {"game_id": ..., <game state>}
+    {"op": "move", "game_id": ..., "move": "e2e4"}                -> {<game state>}
+    {"op": "ai_move", "game_id": ..., "depth": 4, "time_limit": 1.0, "deadline": 5.0}
+                                                                  -> {"move": "e7e5", "score": ..., "nodes": ..., <game state>}
+    {"op": "state", "game_id": ...}                               -> {<game state>}
+    {"op": "close_game", "game_id": ...}                          -> {"closed": true}
+    {"op": "metrics"}                                             -> {"queue_depth": ..., "latency_ms": {...}, ...}
+Game state is {"game_id", "fen", "moves", "status": "ongoing" | "checkmate" | "draw", "draw_reason", "turn": "w" | "b"},
+draw_reason is "stalemate", "fifty-move rule" or "threefold repetition" for drawn games, null otherwise.
+Errors are {"error": "..."} (plus "id"), "busy" when the AI queue is full.
+
+AI requests:
+ - at most one search per pool worker runs at a time, up to max_queue more wait for their game (a pending
+   AI move or move on it) or for a worker (queue_depth), requests beyond that are rejected right away with "busy",
+   so clients back off instead of piling up latency
+ - deadline (seconds, from arrival) bounds queueing plus search: the search time limit is cut to what is left,
+   requests still queued at their deadline are answered with "deadline exceeded"
+ - a connection with too many requests in flight is not read from until some are answered
+
+Usage:
+    python GameServer.py --port 8765 --workers 8
+    printf '{"op": "new_game"}\\n' | nc localhost 8765
+'''
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import ChessAI
+from ChessEngine import GameState, START_FEN
+
+DEFAULT_PORT = 8765
+DEFAULT_DEPTH = 4
+DEFAULT_TIME_LIMIT = 1.0 # seconds of search per AI move if the request gives no limit
+DEADLINE_MARGIN = 0.05 # seconds kept back from the deadline for sending the result
+MAX_REQUESTS_PER_CONNECTION = 64 # requests of one connection handled at once
+LATENCY_WINDOW = 1000 # latency percentiles are taken over this many latest AI requests
+
+
+_searcher = None # one per pool worker process, tables are shared by all games the worker searches
+
+def _init_worker() -> None:
+    global _searcher
+    _searcher = ChessAI.Searcher()
+
+def _search(start_fen: str, moves: list[str], depth: int, time_limit: float, node_limit: int) -> dict:
+    '''Pool task: best move for the position reached by playing moves from start_fen'''
+
+    gs = GameState.from_moves(start_fen, moves)
+    valid_moves = gs.get_valid_moves()
+    if not valid_moves:
+        return {'move': None, 'score': 0, 'nodes': 0}
+    _searcher.new_search()
+    score = _searcher.find_move_iterative_deepening(gs, valid_moves, depth, time_limit, node_limit)
+    return {'move': _searcher.best_moves[0].get_uci_notation(), 'score': score, 'nodes': _searcher.counter}
+
+
+class RequestError(Exception):
+    '''Request can't be served, message goes back to the client'''
+
+
+class Game():
+    '''One game held by the server, the lock keeps its moves in order while an AI move is being searched'''
+
+    def __init__(self, game_id: int, fen: str = START_FEN):
+        self.game_id = game_id
+        self.gs = GameState(fen)
+        self.moves = [] # long algebraic notation, the pool gets start FEN plus moves
+        self.lock = asyncio.Lock()
+        self.valid_moves = self.gs.get_valid_moves()
+
+    def is_over(self) -> bool:
+        return not self.valid_moves or self.gs.draw_reason is not None
+
+    def play(self, notation: str) -> None:
+        '''Play a move given in long algebraic notation, raises RequestError if it's not legal'''
+
+        if self.is_over():
+            raise RequestError('game is over')
+        try:
+            move = self.gs.get_move_from_uci(notation)
+        except ValueError as error:
+            raise RequestError(str(error)) from None
+        self.gs.make_move(move)
+        self.moves.append(move.get_uci_notation())
+        self.valid_moves = self.gs.get_valid_moves()
+
+    def get_state(self) -> dict:
+        status = 'checkmate' if self.gs.checkmate else 'draw' if self.gs.draw_reason is not None else 'ongoing'
+        return {'game_id': self.game_id, 'fen': self.gs.to_fen(), 'moves': self.moves, 'status': status,
+                'draw_reason': self.gs.draw_reason, 'turn': 'w' if self.gs.white_to_move else 'b'}
+
+
+class GameServer():
+    '''
+    Games by id plus the AI pool:
+     - slots limits searches running at once to the number of workers
+     - queued counts AI requests waiting for their game's lock or for a slot, max_queue caps it
+     - latencies of the last LATENCY_WINDOW AI requests (arrival to answer) give the percentiles in metrics
+    '''
+
+    def __init__(self, workers: int = None, max_queue: int = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue if max_queue is not None else self.workers * 16
+        self.games = {}
+        self.game_ids = itertools.count(1)
+        self.executor = None
+        self.slots = None
+        self.queued = 0
+        self.running = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.counts = {'requests': 0, 'ai_requests': 0, 'ai_completed': 0, 'rejected': 0, 'deadline_exceeded': 0, 'errors': 0}
+        self.start_time = time.perf_counter()
+
+    async def start(self, host: str = '127.0.0.1', port: int = DEFAULT_PORT) -> asyncio.AbstractServer:
+        '''Start the process pool and listen for connections'''
+
+        self.executor = ProcessPoolExecutor(self.workers, initializer=_init_worker)
+        self.slots = asyncio.Semaphore(self.workers)
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+    def close(self) -> None:
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        '''Read request lines and answer each one from its own task'''
+
+        in_flight = asyncio.Semaphore(MAX_REQUESTS_PER_CONNECTION)
+        tasks = set()
+
+        async def answer(line: bytes) -> None:
+            try:
+                response = await self.handle_request(line)
+                writer.write(json.dumps(response).encode() + b'\n')
+                await writer.drain()
+            except ConnectionError:
+                pass
+            finally:
+                in_flight.release()
+
+        try:
+            while True:
+                await in_flight.acquire() # backpressure: stop reading while too many requests are in flight
+                line = await reader.readline()
+                if not line:
+                    in_flight.release()
+                    break
+                task = asyncio.create_task(answer(line))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.gather(*tasks)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle_request(self, line: bytes) -> dict:
+        '''Response to one request line'''
+
+        self.counts['requests'] += 1
+        request_id = None
+        try:
+            try:
+                request = json.loads(line)
+            except ValueError:
+                raise RequestError('invalid JSON') from None
+            if not isinstance(request, dict):
+                raise RequestError('request must be a JSON object')
+            request_id = request.get('id')
+            handler = getattr(self, 'op_' + str(request.get('op')), None)
+            if handler is None:
+                raise RequestError(f'unknown op {request.get("op")!r}')
+            response = await handler(request)
+        except RequestError as error:
+            self.counts['errors'] += 1
+            response = {'error': str(error)}
+        except Exception as error: # a bug must not leave the client waiting for an answer that never comes
+            self.counts['errors'] += 1
+            response = {'error': f'internal error: {type(error).__name__}: {error}'}
+        if request_id is not None:
+            response['id'] = request_id
+        return response
+
+    def get_game(self, request: dict) -> Game:
+        game_id = request.get('game_id')
+        if not isinstance(game_id, int) or isinstance(game_id, bool):
+            raise RequestError(f'game_id must be an integer, got {game_id!r}')
+        game = self.games.get(game_id)
+        if game is None:
+            raise RequestError(f'unknown game {request.get("game_id")!r}')
+        return game
+
+    async def op_new_game(self, request: dict) -> dict:
+        fen = request.get('fen')
+        if fen is not None and not isinstance(fen, str):
+            raise RequestError('fen must be a string')
+        try:
+            game = Game(next(self.game_ids), fen or START_FEN)
+        except ValueError as error:
+            raise RequestError(f'invalid FEN: {error}') from None
+        self.games[game.game_id] = game
+        return game.get_state()
+
+    async def op_move(self, request: dict) -> dict:
+        game = self.get_game(request)
+        async with game.lock:
+            game.play(str(request.get('move')))
+            return game.get_state()
+
+    async def op_state(self, request: dict) -> dict:
+        return self.get_game(request).get_state()
+
+    async def op_close_game(self, request: dict) -> dict:
+        self.games.pop(self.get_game(request).game_id)
+        return {'closed': True}
+
+    async def op_metrics(self, request: dict) -> dict:
+        return self.get_metrics()
+
+    async def op_ai_move(self, request: dict) -> dict:
+        '''Search the game's position on the pool and play the best move'''
+
+        arrival = time.perf_counter()
+        game = self.get_game(request)
+        try:
+            depth = int(request['depth']) if request.get('depth') is not None else DEFAULT_DEPTH
+            time_limit = float(request['time_limit']) if request.get('time_limit') is not None else None
+            node_limit = int(request['node_limit']) if request.get('node_limit') is not None else None
+            deadline = arrival + float(request['deadline']) if request.get('deadline') is not None else None
+        except (TypeError, ValueError):
+            raise RequestError('invalid search limits') from None
+        if depth < 1:
+            raise RequestError('depth must be at least 1')
+        if time_limit is None and node_limit is None and 'depth' not in request:
+            time_limit = DEFAULT_TIME_LIMIT
+        if self.queued >= self.max_queue:
+            self.counts['rejected'] += 1
+            raise RequestError('busy')
+
+        self.counts['ai_requests'] += 1
+        self.queued += 1
+        try:
+            await self.acquire(game.lock, deadline)
+        finally:
+            self.queued -= 1
+        try:
+            if game.is_over():
+                raise RequestError('game is over')
+            result = await self.run_search(game, depth, time_limit, node_limit, deadline)
+            if result['move'] is not None:
+                game.play(result['move'])
+        finally:
+            game.lock.release()
+        self.latencies.append(time.perf_counter() - arrival)
+        self.counts['ai_completed'] += 1
+        response = game.get_state()
+        response.update(result)
+        return response
+
+    async def acquire(self, lock: asyncio.Lock | asyncio.Semaphore, deadline: float) -> None:
+        '''Acquire a game lock or a pool slot, raises RequestError when the deadline passes first'''
+
+        if deadline is None:
+            await lock.acquire()
+            return
+        try:
+            await asyncio.wait_for(lock.acquire(), deadline - time.perf_counter())
+        except asyncio.TimeoutError:
+            self.counts['deadline_exceeded'] += 1
+            raise RequestError('deadline exceeded') from None
+
+    async def run_search(self, game: Game, depth: int, time_limit: float, node_limit: int, deadline: float) -> dict:
+        '''Wait for a pool slot (within the deadline) and search, raises RequestError when the deadline passes'''
+
+        self.queued += 1
+        try:
+            await self.acquire(self.slots, deadline)
+        finally:
+            self.queued -= 1
+
+        self.running += 1
+        try:
+            if deadline is not None:
+                remaining = deadline - time.perf_counter() - DEADLINE_MARGIN
+                if remaining <= 0:
+                    self.counts['deadline_exceeded'] += 1
+                    raise RequestError('deadline exceeded')
+                time_limit = min(time_limit, remaining) if time_limit is not None else remaining
+            loop = asyncio.get_running_loop()
+            executor = self.executor
+            try:
+                return await loop.run_in_executor(executor, _search, game.gs.start_fen, list(game.moves), depth, time_limit, node_limit)
+            except BrokenProcessPool:
+                if self.executor is executor: # a worker died, start a new pool for the following searches
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    self.executor = ProcessPoolExecutor(self.workers, initializer=_init_worker)
+                raise RequestError('search failed: worker pool broke and was restarted') from None
+            except Exception as error:
+                raise RequestError(f'search failed: {type(error).__name__}: {error}') from None
+        finally:
+            self.running -= 1
+            self.slots.release()
+
+    def get_metrics(self) -> dict:
+        '''Queue depth, load and AI latency percentiles (milliseconds, arrival to answer)'''
+
+        latencies = sorted(self.latencies)
+
+        def percentile(p: float) -> float:
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] * 1000 if latencies else 0.0
+
+        metrics = {'games': len(self.games),
+                   'workers': self.workers,
+                   'queue_depth': self.queued,
+                   'max_queue': self.max_queue,
+                   'running': self.running,
+                   'uptime': time.perf_counter() - self.start_time,
+                   'latency_ms': {'p50': percentile(0.5), 'p95': percentile(0.95), 'p99': percentile(0.99),
+                                  'max': latencies[-1] * 1000 if latencies else 0.0, 'samples': len(latencies)}}
+        metrics.update(self.counts)
+        return metrics
+
+
+async def serve(host: str, port: int, workers: int = None, max_queue: int = None) -> None:
+    server = GameServer(workers, max_queue)
+    listener = await server.start(host, port)
+    print(f'serving on {host}:{port} with {server.workers} workers', flush=True)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Game server, JSON lines over TCP')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--workers', type=int, default=None, help='AI worker processes (default: CPU count)')
+    parser.add_argument('--max-queue', type=int, default=None, help='AI requests waiting for a worker before new ones are rejected (default: 16 per worker)')
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.max_queue))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,305 @@
+'''
+10x12 mailbox board: an alternative move generator backend, for comparing board layouts with perft.
+
+ - the 8x8 board sits inside a 10x12 array, the two outer rows and the columns on both sides hold OFFBOARD,
+   so leaving the board is one lookup instead of row and column bounds checks
+ - pieces are small ints (color bit 8 set for black), moves are ints, directions are fixed offsets
+ - legal moves are pseudo-legal moves that don't leave the own king attacked, tested by make/unmake
+
+Squares are numbered 21 (a8) to 98 (h1), rows run from the 8th rank down like GameState.board.
+
+Usage:
+    python Perft.py --backend mailbox             # reference suite on this backend
+    python Perft.py --compare --depth 4           # both backends, nodes per second side by side
+'''
+from ChessEngine import START_FEN
+
+EMPTY = 0
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = 1, 2, 3, 4, 5, 6
+WHITE = 0
+BLACK = 8 # color bit of black pieces, also the side to move value
+OFFBOARD = 16
+
+FEN_PIECES = {'P': PAWN, 'N': KNIGHT, 'B': BISHOP, 'R': ROOK, 'Q': QUEEN, 'K': KING,
+              'p': BLACK | PAWN, 'n': BLACK | KNIGHT, 'b': BLACK | BISHOP, 'r': BLACK | ROOK, 'q': BLACK | QUEEN, 'k': BLACK | KING}
+PROMOTION_LETTERS = {KNIGHT: 'n', BISHOP: 'b', ROOK: 'r', QUEEN: 'q'}
+
+KNIGHT_OFFSETS = (-21, -19, -12, -8, 8, 12, 19, 21)
+KING_OFFSETS = (-11, -10, -9, -1, 1, 9, 10, 11)
+ROOK_OFFSETS = (-10, -1, 1, 10)
+BISHOP_OFFSETS = (-11, -9, 9, 11)
+SLIDER_OFFSETS = {BISHOP: BISHOP_OFFSETS, ROOK: ROOK_OFFSETS, QUEEN: ROOK_OFFSETS + BISHOP_OFFSETS}
+
+# castle right bits
+WHITE_KING_SIDE, WHITE_QUEEN_SIDE, BLACK_KING_SIDE, BLACK_QUEEN_SIDE = 1, 2, 4, 8
+# rights kept when a move starts or ends on the square, all other squares keep every right
+CASTLE_MASKS = [15] * 120
+CASTLE_MASKS[95] = 15 & ~(WHITE_KING_SIDE | WHITE_QUEEN_SIDE) # e1
+CASTLE_MASKS[98] = 15 & ~WHITE_KING_SIDE # h1
+CASTLE_MASKS[91] = 15 & ~WHITE_QUEEN_SIDE # a1
+CASTLE_MASKS[25] = 15 & ~(BLACK_KING_SIDE | BLACK_QUEEN_SIDE) # e8
+CASTLE_MASKS[28] = 15 & ~BLACK_KING_SIDE # h8
+CASTLE_MASKS[21] = 15 & ~BLACK_QUEEN_SIDE # a8
+
+# move flags, a move is start | end << 7 | promotion piece << 14 | flags << 17
+ENPASSANT = 1
+CASTLING = 2
+DOUBLE_PUSH = 4
+
+
+def square(row: int, col: int) -> int:
+    '''10x12 index of an 8x8 (row, col)'''
+
+    return 21 + row * 10 + col
+
+def square_name(sq: int) -> str:
+    row, col = divmod(sq - 21, 10)
+    return 'abcdefgh'[col] + str(8 - row)
+
+
+class MailboxBoard():
+    '''
+    Position on a 10x12 board:
+     - board: 120 ints, EMPTY, OFFBOARD or piece (type | color)
+     - side: WHITE or BLACK, kings: king square per color (index 0 white, 1 black)
+     - history: (move, captured piece, castle rights, en passant square, halfmoves) per played move, popped by unmake_move
+    '''
+
+    def __init__(self, fen: str = START_FEN):
+        self.load_fen(fen)
+
+    def load_fen(self, fen: str) -> None:
+        '''Set up the position, raises ValueError for malformed FENs'''
+
+        fields = fen.split()
+        rows = fields[0].split('/') if fields else []
+        if len(rows) != 8 or len(fields) < 4:
+            raise ValueError(f'Invalid FEN: {fen!r}')
+        board = [OFFBOARD] * 120
+        kings = [0, 0]
+        for row, text in enumerate(rows):
+            col = 0
+            for char in text:
+                if char.isdigit():
+                    for _ in range(int(char)):
+                        if col < 8:
+                            board[square(row, col)] = EMPTY
+                        col += 1
+                elif char in FEN_PIECES and col < 8:
+                    piece = FEN_PIECES[char]
+                    board[square(row, col)] = piece
+                    if piece & 7 == KING:
+                        kings[piece >> 3] = square(row, col)
+                    col += 1
+                else:
+                    raise ValueError(f'Invalid FEN board: {fen!r}')
+            if col != 8:
+                raise ValueError(f'Invalid FEN board: {fen!r}')
+        self.board = board
+        self.kings = kings
+        self.side = WHITE if fields[1] == 'w' else BLACK
+        self.castle_rights = sum(bit for char, bit in (('K', WHITE_KING_SIDE), ('Q', WHITE_QUEEN_SIDE),
+                                                       ('k', BLACK_KING_SIDE), ('q', BLACK_QUEEN_SIDE)) if char in fields[2])
+        self.enpassant = 0 if fields[3] == '-' else square(8 - int(fields[3][1]), 'abcdefgh'.index(fields[3][0]))
+        self.halfmoves = int(fields[4]) if len(fields) > 4 else 0
+        self.history = []
+
+    def is_attacked(self, sq: int, by_side: int) -> bool:
+        '''Is the square attacked by pieces of by_side'''
+
+        board = self.board
+        if by_side == WHITE:
+            if board[sq + 9] == PAWN or board[sq + 11] == PAWN: # white pawns attack upwards, so they stand below
+                return True
+        elif board[sq - 9] == BLACK | PAWN or board[sq - 11] == BLACK | PAWN:
+            return True
+        knight = by_side | KNIGHT
+        for offset in KNIGHT_OFFSETS:
+            if board[sq + offset] == knight:
+                return True
+        king = by_side | KING
+        for offset in KING_OFFSETS:
+            if board[sq + offset] == king:
+                return True
+        rook, queen, bishop = by_side | ROOK, by_side | QUEEN, by_side | BISHOP
+        for offset in ROOK_OFFSETS:
+            target = sq + offset
+            piece = board[target]
+            while piece == EMPTY:
+                target += offset
+                piece = board[target]
+            if piece == rook or piece == queen:
+                return True
+        for offset in BISHOP_OFFSETS:
+            target = sq + offset
+            piece = board[target]
+            while piece == EMPTY:
+                target += offset
+                piece = board[target]
+            if piece == bishop or piece == queen:
+                return True
+        return False
+
+    def get_pseudo_legal_moves(self) -> list[int]:
+        '''All moves of the side to move, moves leaving the own king in check included'''
+
+        board = self.board
+        side = self.side
+        enemy = side ^ BLACK
+        moves = []
+        append = moves.append
+        forward, start_row_low, promotion_low = (-10, 81, 21) if side == WHITE else (10, 31, 91)
+        for sq in range(21, 99):
+            piece = board[sq]
+            if piece == EMPTY or piece == OFFBOARD or piece & BLACK != side:
+                continue
+            kind = piece & 7
+            if kind == PAWN:
+                target = sq + forward
+                promotes = promotion_low <= target < promotion_low + 8
+                if board[target] == EMPTY:
+                    if promotes:
+                        for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+                            append(sq | target << 7 | promotion << 14)
+                    else:
+                        append(sq | target << 7)
+                        if start_row_low <= sq < start_row_low + 8 and board[target + forward] == EMPTY:
+                            append(sq | (target + forward) << 7 | DOUBLE_PUSH << 17)
+                for target in (sq + forward - 1, sq + forward + 1):
+                    captured = board[target]
+                    if captured != EMPTY and captured != OFFBOARD and captured & BLACK == enemy:
+                        if promotes:
+                            for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+                                append(sq | target << 7 | promotion << 14)
+                        else:
+                            append(sq | target << 7)
+                    elif target == self.enpassant:
+                        append(sq | target << 7 | ENPASSANT << 17)
+            elif kind == KNIGHT or kind == KING:
+                for offset in (KNIGHT_OFFSETS if kind == KNIGHT else KING_OFFSETS):
+                    target = sq + offset
+                    captured = board[target]
+                    if captured == EMPTY or (captured != OFFBOARD and captured & BLACK == enemy):
+                        append(sq | target << 7)
+            else:
+                for offset in SLIDER_OFFSETS[kind]:
+                    target = sq + offset
+                    captured = board[target]
+                    while captured == EMPTY:
+                        append(sq | target << 7)
+                        target += offset
+                        captured = board[target]
+                    if captured != OFFBOARD and captured & BLACK == enemy:
+                        append(sq | target << 7)
+        self.add_castle_moves(moves)
+        return moves
+
+    def add_castle_moves(self, moves: list[int]) -> None:
+        '''Castling: rights, empty squares between king and rook, king not in check and not passing an attacked square'''
+
+        board = self.board
+        rights = self.castle_rights
+        if self.side == WHITE:
+            king_side, queen_side, king_sq, enemy = rights & WHITE_KING_SIDE, rights & WHITE_QUEEN_SIDE, 95, BLACK
+        else:
+            king_side, queen_side, king_sq, enemy = rights & BLACK_KING_SIDE, rights & BLACK_QUEEN_SIDE, 25, WHITE
+        if not (king_side or queen_side) or self.is_attacked(king_sq, enemy):
+            return
+        if king_side and board[king_sq + 1] == EMPTY and board[king_sq + 2] == EMPTY and not self.is_attacked(king_sq + 1, enemy):
+            moves.append(king_sq | (king_sq + 2) << 7 | CASTLING << 17)
+        if queen_side and board[king_sq - 1] == EMPTY and board[king_sq - 2] == EMPTY and board[king_sq - 3] == EMPTY \
+                and not self.is_attacked(king_sq - 1, enemy):
+            moves.append(king_sq | (king_sq - 2) << 7 | CASTLING << 17)
+
+    def make_move(self, move: int) -> bool:
+        '''Play a pseudo-legal move, returns False (with the move already taken back) if it leaves the own king attacked'''
+
+        board = self.board
+        start = move & 127
+        end = move >> 7 & 127
+        flags = move >> 17
+        piece = board[start]
+        captured = board[end]
+        self.history.append((move, captured, self.castle_rights, self.enpassant, self.halfmoves))
+        board[end] = (move >> 14 & 7 | self.side) if move >> 14 & 7 else piece
+        board[start] = EMPTY
+        self.halfmoves = 0 if captured or piece & 7 == PAWN else self.halfmoves + 1
+        self.enpassant = 0
+        if flags:
+            if flags & ENPASSANT:
+                board[end + (10 if self.side == WHITE else -10)] = EMPTY
+            elif flags & DOUBLE_PUSH:
+                self.enpassant = (start + end) >> 1
+            elif flags & CASTLING:
+                if end > start:
+                    board[end - 1], board[end + 1] = board[end + 1], EMPTY
+                else:
+                    board[end + 1], board[end - 2] = board[end - 2], EMPTY
+        if piece & 7 == KING:
+            self.kings[piece >> 3] = end
+        self.castle_rights &= CASTLE_MASKS[start] & CASTLE_MASKS[end]
+        side = self.side
+        self.side = side ^ BLACK
+        if self.is_attacked(self.kings[side >> 3], self.side):
+            self.unmake_move()
+            return False
+        return True
+
+    def unmake_move(self) -> None:
+        '''Take back the last move'''
+
+        move, captured, self.castle_rights, self.enpassant, self.halfmoves = self.history.pop()
+        board = self.board
+        start = move & 127
+        end = move >> 7 & 127
+        flags = move >> 17
+        self.side ^= BLACK
+        side = self.side
+        piece = (PAWN | side) if move >> 14 & 7 else board[end]
+        board[start] = piece
+        board[end] = captured
+        if flags & ENPASSANT:
+            board[end + (10 if side == WHITE else -10)] = PAWN | (side ^ BLACK)
+        elif flags & CASTLING:
+            if end > start:
+                board[end + 1], board[end - 1] = board[end - 1], EMPTY
+            else:
+                board[end - 2], board[end + 1] = board[end + 1], EMPTY
+        if piece & 7 == KING:
+            self.kings[side >> 3] = start
+
+    def get_legal_moves(self) -> list[int]:
+        legal_moves = []
+        for move in self.get_pseudo_legal_moves():
+            if self.make_move(move):
+                legal_moves.append(move)
+                self.unmake_move()
+        return legal_moves
+
+    @staticmethod
+    def get_uci_notation(move: int) -> str:
+        promotion = move >> 14 & 7
+        return square_name(move & 127) + square_name(move >> 7 & 127) + (PROMOTION_LETTERS[promotion] if promotion else '')
+
+
+def perft(board: MailboxBoard, depth: int) -> int:
+    '''Number of leaf nodes of the legal move tree depth plies deep (bulk counting like Perft.perft)'''
+
+    if depth <= 1:
+        return len(board.get_legal_moves()) if depth == 1 else 1
+    nodes = 0
+    for move in board.get_pseudo_legal_moves():
+        if board.make_move(move):
+            nodes += perft(board, depth - 1)
+            board.unmake_move()
+    return nodes
+
+def divide(board: MailboxBoard, depth: int) -> dict[str, int]:
+    '''Leaf counts of every root move (long algebraic notation)'''
+
+    counts = {}
+    for move in board.get_legal_moves():
+        board.make_move(move)
+        counts[board.get_uci_notation(move)] = perft(board, depth - 1)
+        board.unmake_move()
+    return counts
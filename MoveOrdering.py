@@ -0,0 +1,156 @@
+'''
+Move ordering for the alpha-beta search, the earlier the best move is searched the more branches get pruned.
+'''
+from operator import itemgetter
+from Bitboards import SQUARE_BB
+
+MAX_PLY = 128
+
+# piece values for ordering captures, king as attacker is the least valuable choice
+ORDER_VALUES = {'P': 1, 'N': 3, 'B': 3, 'R': 5, 'Q': 9, 'K': 10}
+
+HASH_MOVE_SCORE = 1 << 30
+CAPTURE_SCORE = 1 << 28 # + MVV-LVA
+PROMOTION_SCORE = 1 << 27
+KILLER_SCORE = 1 << 26 # - killer slot
+# quiet moves are scored by history alone, which stays far below killer moves
+
+
+class MoveOrderer():
+    '''
+    Ranks moves for the search:
+     - hash move (best move from the transposition table)
+     - captures by MVV-LVA (most valuable victim, then least valuable attacker)
+     - promotions
+     - killer moves (quiet moves that caused a cutoff at the same ply)
+     - remaining quiet moves by history score (how often and how deep they caused cutoffs)
+    '''
+
+    def __init__(self):
+        self.killers = [[0, 0] for _ in range(MAX_PLY)] # 2 killer move codes per ply
+        self.history = [[0] * 4096, [0] * 4096] # white and black, indexed by move code start * 64 + end
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        '''Zero per search counters'''
+
+        self.cutoffs = 0 # nodes where a move caused a beta cutoff
+        self.first_move_cutoffs = 0 # cutoffs caused by the first searched move
+        self.hash_move_cutoffs = 0
+        self.killer_cutoffs = 0
+
+    def new_search(self) -> None:
+        '''Prepare for a new search: forget killers, age history scores, reset counters'''
+
+        for killers in self.killers:
+            killers[0] = killers[1] = 0
+        for history in self.history:
+            for i in range(4096):
+                history[i] >>= 1
+        self.reset_stats()
+
+    def order_moves(self, moves: list, ply: int, hash_move: int = 0, white_to_move: bool = True) -> list:
+        '''Returns moves sorted from most to least promising'''
+
+        killers = self.killers[ply] if ply < MAX_PLY else (0, 0)
+        history = self.history[0 if white_to_move else 1]
+        scored_moves = []
+        for move in moves:
+            code = move.code
+            if code == hash_move:
+                score = HASH_MOVE_SCORE
+            elif move.piece_captured != '--':
+                score = CAPTURE_SCORE + ORDER_VALUES[move.piece_captured[1]] * 16 - ORDER_VALUES[move.piece_moved[1]]
+            elif code >= 4096: # promotion
+                score = PROMOTION_SCORE + ORDER_VALUES[move.promotion_piece[1]]
+            elif code == killers[0]:
+                score = KILLER_SCORE
+            elif code == killers[1]:
+                score = KILLER_SCORE - 1
+            else:
+                score = history[code & 4095]
+            scored_moves.append((score, move))
+        scored_moves.sort(key=itemgetter(0), reverse=True) # stable, equally scored moves keep their order
+        return [move for _, move in scored_moves]
+
+    def generate_moves(self, gs, ply: int, hash_move: int = 0):
+        '''
+        Yields legal moves of the position stage by stage, a stage is only generated when the search asks for more moves,
+        so nodes cut off by an early move never build the rest:
+         - hash move, if it's legal in this position
+         - captures and promotions by MVV-LVA
+         - killer moves, if they are legal quiet moves in this position
+         - remaining quiet moves by history score
+        Position must be the same every time the generator is resumed (moves made by the search are undone in between)
+        '''
+        
+        white_to_move = gs.white_to_move
+        check_info = gs.get_check_info() # shared by all stages
+        
+        if hash_move:
+            move = self.find_legal_move(gs, hash_move, check_info)
+            if move is not None:
+                yield move
+        
+        for move in self.order_moves(gs.get_legal_moves(quiets=False, check_info=check_info), ply, 0, white_to_move):
+            if move.code != hash_move:
+                yield move
+        
+        killers = self.killers[ply] if ply < MAX_PLY else (0, 0)
+        searched = [hash_move]
+        for killer in killers:
+            if killer and killer not in searched:
+                move = self.find_legal_move(gs, killer, check_info)
+                if move is not None and move.piece_captured == '--' and move.code < 4096: # captures and promotions were searched already
+                    searched.append(killer)
+                    yield move
+        
+        history = self.history[0 if white_to_move else 1]
+        scored_moves = []
+        for move in gs.get_legal_moves(captures=False, check_info=check_info):
+            code = move.code
+            if code not in searched:
+                scored_moves.append((history[code & 4095], move))
+        scored_moves.sort(key=itemgetter(0), reverse=True)
+        for _, move in scored_moves:
+            yield move
+    
+    def find_legal_move(self, gs, move_code: int, check_info: tuple = None):
+        '''Returns Move matching the move code if it is legal in the position, otherwise None'''
+        
+        start = move_code >> 6 & 63
+        if not gs.occupancy['w' if gs.white_to_move else 'b'] & SQUARE_BB[start]: # quick reject, no piece of ours to move
+            return None
+        for move in gs.get_legal_moves(from_mask=SQUARE_BB[start], check_info=check_info):
+            if move.code == move_code:
+                return move
+        return None
+    
+    def record_cutoff(self, move, ply: int, depth: int, move_number: int, hash_move: int = 0, white_to_move: bool = True) -> None:
+        '''Update killers, history and counters after move caused a beta cutoff (move_number starts at 0)'''
+
+        self.cutoffs += 1
+        if move_number == 0:
+            self.first_move_cutoffs += 1
+        code = move.code
+        if code == hash_move:
+            self.hash_move_cutoffs += 1
+        if move.piece_captured != '--' or code >= 4096: # only quiet moves are killers, not captures and promotions
+            return
+        if ply < MAX_PLY:
+            killers = self.killers[ply]
+            if code == killers[0] or code == killers[1]:
+                self.killer_cutoffs += 1
+            if code != killers[0]:
+                killers[1] = killers[0]
+                killers[0] = code
+        self.history[0 if white_to_move else 1][code & 4095] += depth * depth
+
+    def get_stats(self) -> dict:
+        '''Counters of the current search'''
+
+        return {'cutoffs': self.cutoffs,
+                'first_move_cutoffs': self.first_move_cutoffs,
+                'first_move_cutoff_rate': self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0,
+                'hash_move_cutoffs': self.hash_move_cutoffs,
+                'killer_cutoffs': self.killer_cutoffs}
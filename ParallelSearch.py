@@ -0,0 +1,265 @@
+'''
+Parallel root search: iterative deepening where the root moves of every iteration are split across a pool of worker processes.
+
+ - the first (best so far) root move is searched alone with a full window to get a score to beat,
+   the remaining root moves are then handed out one per task, so fast and slow subtrees balance out over the workers
+ - every worker keeps its own searcher (transposition table, killers and history) between tasks and iterations,
+   results are merged at the root by the parent
+ - nodes and time are collected per worker, so nodes per second can be reported per worker and overall
+ - a node limit is one budget for the whole search: workers add their nodes to a shared count every 1024 nodes
+   and stop when it reaches the limit, so it can be overshot by about 1024 nodes per worker
+
+Usage:
+    python ParallelSearch.py --workers 8 --depth 5                # parallel search of the initial position
+    python ParallelSearch.py --workers 8 --depth 5 --benchmark    # also run the serial search and report speedup
+'''
+import argparse
+import multiprocessing as mp
+import os
+import time
+import ChessAI
+from ChessEngine import GameState, Move
+
+SEARCH_WORKERS = os.cpu_count() or 1 # default pool size
+
+_pool = None
+_pool_workers = 0
+_pool_tt_size_mb = 0
+_stop_event = None # shared with the workers, set by stop_search
+_node_count = None # shared with the workers, nodes searched so far by the running search
+_search_id = 0 # tells workers when a new root search starts, so they age their tables once per search
+last_search_stats = {} # filled by find_move_parallel
+
+
+def _init_worker(tt_size_mb: float, stop_event, node_count) -> None:
+    '''Runs once in every worker process'''
+
+    global _searcher, _worker_search_id, _worker_position, _stop_event, _node_count, _worker_node_limit, _nodes_published
+    _searcher = ChessAI.Searcher(tt_size_mb=tt_size_mb)
+    _searcher.stop = _should_stop
+    _worker_search_id = None
+    _worker_position = None
+    _stop_event = stop_event
+    _node_count = node_count
+    _worker_node_limit = float('inf')
+    _nodes_published = 0
+
+def _publish_nodes() -> int:
+    '''Add the nodes searched since the last call to the shared count, returns the new count'''
+
+    global _nodes_published
+    with _node_count.get_lock():
+        _node_count.value += _searcher.counter - _nodes_published
+        total = _node_count.value
+    _nodes_published = _searcher.counter
+    return total
+
+def _should_stop() -> bool:
+    '''Searcher.stop of the workers, checked every 1024 nodes: stop_search was called or the search's node budget is spent'''
+
+    return _publish_nodes() >= _worker_node_limit or _stop_event.is_set()
+
+def _search_root_move(start_fen: str, moves: list[str], move_code: int, depth: int, alpha: float, time_left: float, node_limit: float,
+                      search_id: int, limited: bool = True) -> tuple:
+    '''
+    Worker task: search one root move of the position reached by playing moves (long algebraic notation) from start_fen to depth,
+    limits and stop_search only apply if limited, node_limit is the budget of the whole search (shared count). The game's moves are replayed so repetitions of earlier positions are seen.
+    Moves that can't beat alpha only return an upper bound, moves scoring alpha or more get exact scores (so ties are real).
+    Returns (move code, score, nodes, seconds, worker pid, completed)
+    '''
+
+    global _worker_search_id, _worker_position, _worker_node_limit, _nodes_published
+
+    searcher = _searcher
+    if search_id != _worker_search_id: # replay the game once per search, following tasks start from the same position
+        _worker_search_id = search_id
+        searcher.new_search()
+        _worker_position = GameState.from_moves(start_fen, moves)
+
+    start_time = time.perf_counter()
+    gs = _worker_position
+    root_ply = len(gs.move_log)
+    move = searcher.move_orderer.find_legal_move(gs, move_code)
+    searcher.counter = 0
+    _nodes_published = 0
+    _worker_node_limit = node_limit if node_limit is not None else float('inf')
+    searcher.limits_active = limited
+    searcher.deadline = start_time + time_left if time_left is not None else float('inf')
+    searcher.node_limit = _worker_node_limit - _node_count.value # exact while the task searches alone
+    completed = True
+    score = None
+    gs.make_move(move)
+    try:
+        score = -searcher.find_move_negamax_ab_pruning(gs, None, depth - 1, float('-inf'), -(alpha - 1), 1)
+    except ChessAI.SearchTimeout:
+        completed = False
+    while len(gs.move_log) > root_ply: # root move and whatever an interrupted search left on the board
+        gs.undo_last_move()
+    searcher.limits_active = False
+    _publish_nodes()
+    return move_code, score, searcher.counter, time.perf_counter() - start_time, os.getpid(), completed
+
+def get_pool(workers: int = SEARCH_WORKERS, tt_size_mb: float = ChessAI.TT_SIZE_MB):
+    '''Worker pool, created on first use and kept for following searches so worker tables stay warm'''
+
+    global _pool, _pool_workers, _pool_tt_size_mb, _stop_event, _node_count
+
+    if _pool is None or _pool_workers != workers or _pool_tt_size_mb != tt_size_mb:
+        close_pool()
+        _stop_event = mp.Event()
+        _node_count = mp.Value('q', 0)
+        _pool = mp.Pool(workers, initializer=_init_worker, initargs=(tt_size_mb, _stop_event, _node_count))
+        _pool_workers = workers
+        _pool_tt_size_mb = tt_size_mb
+    return _pool
+
+def stop_search() -> None:
+    '''Ask the running parallel search to stop (from another thread), it returns the last completed iteration'''
+
+    if _stop_event is not None:
+        _stop_event.set()
+
+def clear_stop() -> None:
+    '''Reset the stop request before a new search, from the thread that calls stop_search'''
+
+    if _stop_event is not None:
+        _stop_event.clear()
+
+def close_pool() -> None:
+    '''Stop worker processes'''
+
+    global _pool, _pool_workers
+
+    if _pool is not None:
+        _pool.terminate()
+        _pool.join()
+        _pool = None
+        _pool_workers = 0
+
+def find_move_parallel(gs: GameState, valid_moves: list[Move], depth: int = ChessAI.MAX_DEPTH, time_limit: float = None,
+                       node_limit: int = None, workers: int = SEARCH_WORKERS, tt_size_mb: float = ChessAI.TT_SIZE_MB,
+                       info_callback = None) -> tuple[int, list[Move]]:
+    '''
+    Iterative deepening with root moves split across worker processes, to depth, time (seconds) or node limit.
+    Returns score and best moves of the deepest completed iteration, info_callback(depth, score, nodes, seconds,
+    principal variation) is called after every iteration like in Searcher.find_move_iterative_deepening.
+    Per worker and overall node counts are left in last_search_stats. A stop_search request stays in force until clear_stop
+    '''
+
+    global _search_id, last_search_stats
+
+    pool = get_pool(workers, tt_size_mb)
+    _search_id += 1
+    _node_count.value = 0
+    moves_played = [move.get_uci_notation() for move in gs.move_log] # with the start FEN, lets workers see repetitions
+    start_time = time.perf_counter()
+    deadline = start_time + time_limit if time_limit is not None else None
+    worker_stats = {}
+    total_nodes = 0
+    completed_depth = 0
+    score = 0
+    scores = {move.code: 0 for move in valid_moves} # last iteration's score of every root move, for ordering
+    moves = {move.code: move for move in valid_moves}
+    best_moves = []
+
+    def collect(result: tuple) -> None:
+        nonlocal total_nodes
+        _, _, nodes, seconds, pid, _ = result
+        stats = worker_stats.setdefault(pid, {'nodes': 0, 'time': 0.0})
+        stats['nodes'] += nodes
+        stats['time'] += seconds
+        total_nodes += nodes
+
+    for d in range(1, depth + 1):
+        limited = d > 1 # always complete depth 1 so there is a move to play
+        time_left = deadline - time.perf_counter() if limited and deadline is not None else None
+        if (time_left is not None and time_left <= 0) or (limited and node_limit is not None and total_nodes >= node_limit):
+            break
+        order = sorted(scores, key=scores.get, reverse=True)
+
+        # first move alone with a full window, its score is the one to beat for the others
+        first = pool.apply(_search_root_move, (gs.start_fen, moves_played, order[0], d, float('-inf'), time_left, node_limit, _search_id, limited))
+        collect(first)
+        if not first[5]:
+            break
+        iteration_scores = {first[0]: first[1]}
+        if len(order) > 1:
+            time_left = deadline - time.perf_counter() if time_left is not None else None
+            tasks = [(gs.start_fen, moves_played, code, d, first[1], time_left, node_limit, _search_id, limited) for code in order[1:]]
+            results = pool.starmap(_search_root_move, tasks, chunksize=1)
+            for result in results:
+                collect(result)
+            if not all(result[5] for result in results):
+                break # interrupted iteration is thrown away
+            iteration_scores.update((result[0], result[1]) for result in results)
+
+        scores = iteration_scores
+        score = max(scores.values())
+        best_moves = [moves[code] for code in order if scores[code] == score]
+        completed_depth = d
+        if info_callback is not None:
+            pv = best_moves[:1] # workers keep the rest of the line in their own tables
+            info_callback(d, score, total_nodes, time.perf_counter() - start_time, pv)
+        if _stop_event.is_set():
+            break
+        if abs(score) >= ChessAI.MATE_THRESHOLD: # forced mate found, deeper search won't change the result
+            break
+        if time_limit is not None and time.perf_counter() - start_time > time_limit / 2: # next iteration would not finish in time
+            break
+
+    elapsed = time.perf_counter() - start_time
+    last_search_stats = {
+        'workers': workers,
+        'depth': completed_depth,
+        'nodes': total_nodes,
+        'time': elapsed,
+        'nps': int(total_nodes / elapsed) if elapsed else 0,
+        'worker_stats': [{'pid': pid, 'nodes': stats['nodes'], 'time': stats['time'],
+                          'nps': int(stats['nodes'] / stats['time']) if stats['time'] else 0}
+                         for pid, stats in sorted(worker_stats.items())]}
+    return score, best_moves
+
+def benchmark(fen: str, depth: int, workers: int = SEARCH_WORKERS) -> dict:
+    '''
+    Search the position to depth serially and in parallel, print nodes per second per worker and the speedup
+    (serial time / parallel time to reach the same depth). Returns the parallel search stats plus speedup
+    '''
+
+    gs = GameState.from_fen(fen)
+    searcher = ChessAI.Searcher()
+    start_time = time.perf_counter()
+    serial_score = searcher.find_move_iterative_deepening(gs, gs.get_valid_moves(), depth)
+    serial_time = time.perf_counter() - start_time
+    serial_nodes = searcher.counter
+    print(f'serial    depth {depth}  score {serial_score}  nodes {serial_nodes}  time {serial_time:.2f}s  nps {int(serial_nodes / serial_time)}'
+          f'  best {[move.get_chess_notation() for move in searcher.best_moves]}')
+
+    get_pool(workers) # start workers outside of the timed search
+    parallel_score, best_moves = find_move_parallel(gs, gs.get_valid_moves(), depth, workers=workers)
+    stats = dict(last_search_stats)
+    stats['speedup'] = serial_time / stats['time'] if stats['time'] else 0.0
+    print(f'parallel  depth {stats["depth"]}  score {parallel_score}  nodes {stats["nodes"]}  time {stats["time"]:.2f}s  nps {stats["nps"]}'
+          f'  best {[move.get_chess_notation() for move in best_moves]}')
+    for worker in stats['worker_stats']:
+        print(f'  worker {worker["pid"]}  nodes {worker["nodes"]}  busy {worker["time"]:.2f}s  nps {worker["nps"]}')
+    print(f'speedup {stats["speedup"]:.2f}x with {workers} workers')
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Parallel root search')
+    parser.add_argument('--fen', default='rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1')
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--time', type=float, default=None, help='time limit in seconds')
+    parser.add_argument('--workers', type=int, default=SEARCH_WORKERS)
+    parser.add_argument('--benchmark', action='store_true', help='compare with the serial search')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.fen, args.depth, args.workers)
+    else:
+        position = GameState.from_fen(args.fen)
+        result, best_moves = find_move_parallel(position, position.get_valid_moves(), args.depth, args.time, workers=args.workers)
+        print('score', result, 'best', [move.get_chess_notation() for move in best_moves])
+        print(last_search_stats)
+    close_pool()
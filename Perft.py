@@ -0,0 +1,201 @@
+'''
+Perft (performance test) - counts leaf nodes of the legal move tree to a fixed depth.
+Counts are compared against known values of reference positions to verify move generation,
+nodes per second give a throughput number to compare move generator changes against.
+
+Usage:
+    python Perft.py                                  # reference suite up to depth 3
+    python Perft.py --depth 4 --max-nodes 5000000    # deeper suite, skipping depths with more known nodes
+    python Perft.py --fen "<fen>" --depth 3 --divide # leaf counts per root move of a single position
+    python Perft.py --backend mailbox                # same suite on the 10x12 mailbox board (Mailbox.py)
+    python Perft.py --compare --depth 4              # every backend, nodes per second side by side
+    python Perft.py --make-undo 200                  # make/undo round trip check, then pairs per second
+'''
+import argparse
+import time
+import Mailbox
+from ChessEngine import GameState
+
+# (name, FEN, known leaf counts for depth 1, 2, 3...)
+# https://www.chessprogramming.org/Perft_Results
+REFERENCE_POSITIONS = [
+    ('initial', 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+     [20, 400, 8902, 197281, 4865609]),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     [48, 2039, 97862, 4085603]),
+    ('en passant and pins', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     [14, 191, 2812, 43238, 674624]),
+    ('promotions and castling', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     [6, 264, 9467, 422333]),
+    ('promotions and castling mirrored', 'r2q1rk1/pP1p2pp/Q4n2/bbp1p3/Np6/1B3NBn/pPPP1PPP/R3K2R b KQ - 0 1',
+     [6, 264, 9467, 422333]),
+    ('underpromotion discovered check', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     [44, 1486, 62379, 2103487]),
+    ('middlegame', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     [46, 2079, 89890, 3894594]),
+]
+
+
+def perft(gs: GameState, depth: int) -> int:
+    '''Number of leaf nodes of the legal move tree depth plies deep'''
+
+    moves = gs.get_legal_moves()
+    if depth <= 1:
+        return len(moves) if depth == 1 else 1 # bulk counting, the last ply is never played
+    nodes = 0
+    for move in moves:
+        gs.make_move(move)
+        nodes += perft(gs, depth - 1)
+        gs.undo_last_move()
+    return nodes
+
+def divide(gs: GameState, depth: int) -> dict[str, int]:
+    '''Leaf counts of every root move (long algebraic notation), for finding which move a wrong count comes from'''
+
+    counts = {}
+    for move in gs.get_legal_moves():
+        gs.make_move(move)
+        counts[move.get_uci_notation()] = perft(gs, depth - 1)
+        gs.undo_last_move()
+    return counts
+
+# board backend name: (position from FEN, perft, divide)
+BACKENDS = {
+    'bitboard': (GameState.from_fen, perft, divide),
+    'mailbox': (Mailbox.MailboxBoard, Mailbox.perft, Mailbox.divide),
+}
+
+def run_perft(fen: str, depth: int, show_divide: bool = False, backend: str = 'bitboard') -> tuple[int, float]:
+    '''Run perft for a single position and print nodes, time and nodes per second, returns (nodes, seconds)'''
+
+    load, count, count_per_move = BACKENDS[backend]
+    position = load(fen)
+    start_time = time.perf_counter()
+    if show_divide:
+        counts = count_per_move(position, depth)
+        nodes = sum(counts.values())
+    else:
+        nodes = count(position, depth)
+    elapsed = time.perf_counter() - start_time
+    if show_divide:
+        for move, count in sorted(counts.items()):
+            print(f'{move}: {count}')
+        print(f'moves: {len(counts)}')
+    print(f'depth {depth}  nodes {nodes}  time {elapsed:.3f}s  nps {int(nodes / elapsed) if elapsed else 0}')
+    return nodes, elapsed
+
+def run_reference_suite(max_depth: int = 3, max_nodes: int = None, backend: str = 'bitboard') -> bool:
+    '''
+    Check perft counts of all reference positions up to max_depth, depths with more known nodes than max_nodes are skipped.
+    Prints a line per position and depth plus total nodes per second, returns True if all counts match
+    '''
+
+    return suite_results(max_depth, max_nodes, backend)[0]
+
+def suite_results(max_depth: int, max_nodes: int, backend: str) -> tuple[bool, int, float]:
+    '''Reference suite on one backend, returns (all counts match, total nodes, total seconds)'''
+
+    load, count, _ = BACKENDS[backend]
+    passed = True
+    total_nodes = 0
+    total_time = 0.0
+    for name, fen, known_counts in REFERENCE_POSITIONS:
+        for depth, expected in enumerate(known_counts[:max_depth], 1):
+            if max_nodes is not None and expected > max_nodes:
+                break
+            position = load(fen)
+            start_time = time.perf_counter()
+            nodes = count(position, depth)
+            elapsed = time.perf_counter() - start_time
+            total_nodes += nodes
+            total_time += elapsed
+            result = 'ok' if nodes == expected else f'FAILED (expected {expected})'
+            passed = passed and nodes == expected
+            print(f'{name:<34} depth {depth}  nodes {nodes:>9}  time {elapsed:7.3f}s  nps {int(nodes / elapsed) if elapsed else 0:>8}  {result}')
+    print(f'total nodes {total_nodes}  time {total_time:.3f}s  nps {int(total_nodes / total_time) if total_time else 0}')
+    print('all counts match' if passed else 'MOVE GENERATION ERRORS')
+    return passed, total_nodes, total_time
+
+def compare_backends(max_depth: int = 3, max_nodes: int = None) -> bool:
+    '''Run the reference suite on every backend and print their nodes per second, fastest first'''
+
+    results = {}
+    for backend in BACKENDS:
+        print(f'--- {backend}')
+        results[backend] = suite_results(max_depth, max_nodes, backend)
+    print('---')
+    ranking = sorted(results.items(), key=lambda item: -item[1][1] / item[1][2] if item[1][2] else 0)
+    for backend, (passed, nodes, seconds) in ranking:
+        print(f'{backend:<10} nps {int(nodes / seconds) if seconds else 0:>8}  {"ok" if passed else "FAILED"}')
+    return all(passed for passed, _, _ in results.values())
+
+def check_make_undo(depth: int = 2) -> bool:
+    '''
+    Play every move of the reference positions depth plies deep and check that the Zobrist key after make_move matches one
+    computed from scratch, and that undo_last_move brings back the same FEN and key. Prints mismatches, returns True if there are none
+    '''
+
+    def check(gs: GameState, depth: int) -> bool:
+        passed = True
+        for move in gs.get_legal_moves():
+            fen, key = gs.to_fen(), gs.zobrist_key
+            gs.make_move(move)
+            if gs.zobrist_key != gs.compute_zobrist_key():
+                print(f'{fen} {move.get_uci_notation()}: key after make_move differs from computed key')
+                passed = False
+            if depth > 1:
+                passed = check(gs, depth - 1) and passed
+            gs.undo_last_move()
+            if gs.to_fen() != fen or gs.zobrist_key != key:
+                print(f'{fen} {move.get_uci_notation()}: undo_last_move does not restore the position')
+                passed = False
+        return passed
+
+    return all([check(GameState.from_fen(fen), depth) for _, fen, _ in REFERENCE_POSITIONS])
+
+def make_undo_benchmark(repeats: int = 200, rounds: int = 5) -> float:
+    '''
+    Time make_move/undo_last_move pairs over the legal moves of the reference positions, without move generation.
+    Each round plays every root move repeats times per position, the best round is kept against timer noise.
+    Positions and keys are checked to survive make/undo first. Prints and returns microseconds per pair
+    '''
+
+    print('make/undo restores positions and keys' if check_make_undo() else 'MAKE/UNDO ERRORS')
+    positions = [GameState.from_fen(fen) for _, fen, _ in REFERENCE_POSITIONS]
+    root_moves = [gs.get_legal_moves() for gs in positions]
+    pairs = repeats * sum(len(moves) for moves in root_moves)
+    best = None
+    for _ in range(rounds):
+        start_time = time.perf_counter()
+        for gs, moves in zip(positions, root_moves):
+            make_move, undo_last_move = gs.make_move, gs.undo_last_move
+            for _ in range(repeats):
+                for move in moves:
+                    make_move(move)
+                    undo_last_move()
+        elapsed = time.perf_counter() - start_time
+        best = elapsed if best is None else min(best, elapsed)
+    microseconds = best / pairs * 1e6
+    print(f'make/undo pairs {pairs}  best of {rounds} {best:.3f}s  {microseconds:.2f} us per pair  {int(pairs / best)} pairs per second')
+    return microseconds
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Perft move generator verification and benchmark')
+    parser.add_argument('--fen', help='position to count instead of running the reference suite')
+    parser.add_argument('--depth', type=int, default=3, help='depth in plies (max depth for the reference suite)')
+    parser.add_argument('--divide', action='store_true', help='print leaf counts per root move (with --fen)')
+    parser.add_argument('--max-nodes', type=int, default=None, help='skip reference depths with more known nodes than this')
+    parser.add_argument('--backend', choices=BACKENDS, default='bitboard', help='board representation to count with')
+    parser.add_argument('--compare', action='store_true', help='run the reference suite on every backend and rank them by nps')
+    parser.add_argument('--make-undo', type=int, metavar='REPEATS', help='benchmark make/undo pairs, every root move played REPEATS times')
+    args = parser.parse_args()
+
+    if args.make_undo:
+        make_undo_benchmark(args.make_undo)
+    elif args.fen:
+        run_perft(args.fen, args.depth, args.divide, args.backend)
+    elif args.compare:
+        raise SystemExit(0 if compare_backends(args.depth, args.max_nodes) else 1)
+    else:
+        raise SystemExit(0 if run_reference_suite(args.depth, args.max_nodes, args.backend) else 1)
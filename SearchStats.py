@@ -0,0 +1,74 @@
+'''
+Statistics of one search, collected by ChessAI so search changes can be measured and tuned.
+'''
+
+
+class SearchStats():
+    '''
+    Counters of one search:
+     - nodes (all visited positions, quiescence included) and qnodes (quiescence only)
+     - depth of the deepest completed iteration and seldepth (deepest ply reached, quiescence included)
+     - transposition table probes and hits, beta cutoffs and how many came from the first searched move
+     - per iteration depth, score, nodes and seconds, from which the branching factor is taken
+    '''
+
+    def __init__(self):
+        self.nodes = 0
+        self.qnodes = 0
+        self.depth = 0
+        self.seldepth = 0
+        self.tt_probes = 0
+        self.tt_hits = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.time = 0.0
+        self.iterations = [] # {'depth', 'score', 'nodes', 'time'} of every completed iteration
+
+    @property
+    def nps(self) -> int:
+        return int(self.nodes / self.time) if self.time else 0
+
+    @property
+    def tt_hit_rate(self) -> float:
+        return self.tt_hits / self.tt_probes if self.tt_probes else 0.0
+
+    @property
+    def first_move_cutoff_rate(self) -> float:
+        '''Share of beta cutoffs caused by the first move searched, how good move ordering is (1.0 is perfect)'''
+
+        return self.first_move_cutoffs / self.cutoffs if self.cutoffs else 0.0
+
+    @property
+    def branching_factor(self) -> float:
+        '''Effective branching factor: nodes of the last completed iteration over nodes of the one before'''
+
+        if len(self.iterations) < 2 or not self.iterations[-2]['nodes']:
+            return 0.0
+        return self.iterations[-1]['nodes'] / self.iterations[-2]['nodes']
+
+    def to_dict(self) -> dict:
+        '''Counters and derived rates as plain values, ready for JSON'''
+
+        return {'nodes': self.nodes,
+                'qnodes': self.qnodes,
+                'depth': self.depth,
+                'seldepth': self.seldepth,
+                'time': self.time,
+                'nps': self.nps,
+                'tt_probes': self.tt_probes,
+                'tt_hits': self.tt_hits,
+                'tt_hit_rate': self.tt_hit_rate,
+                'cutoffs': self.cutoffs,
+                'first_move_cutoffs': self.first_move_cutoffs,
+                'first_move_cutoff_rate': self.first_move_cutoff_rate,
+                'branching_factor': self.branching_factor,
+                'iterations': [dict(iteration) for iteration in self.iterations]}
+
+    def to_json(self) -> str:
+        import json # only needed when stats are written out
+        return json.dumps(self.to_dict())
+
+    def __repr__(self) -> str:
+        return (f'SearchStats(depth={self.depth}, seldepth={self.seldepth}, nodes={self.nodes}, qnodes={self.qnodes}, '
+                f'nps={self.nps}, tt_hit_rate={self.tt_hit_rate:.2f}, first_move_cutoff_rate={self.first_move_cutoff_rate:.2f}, '
+                f'branching_factor={self.branching_factor:.2f})')
@@ -0,0 +1,147 @@
+'''
+Long-lived AI search process for the GUI (and anything else that asks the AI for moves over and over).
+
+Instead of spawning a process and pickling the whole GameState for every AI move, one worker process is started
+once and receives small requests: the position as start FEN plus moves played in long algebraic notation, and limits.
+The worker's searcher (transposition table, killers and history) stays alive between moves.
+
+Protocol (dicts over multiprocessing queues):
+    request  {'id', 'fen', 'moves', 'depth', 'time_limit', 'node_limit', 'new_game'}
+    response {'id', 'move', 'score', 'pv', 'nodes', 'time', 'cancelled', 'stats'}
+'move' is None only if the position has no legal moves. Cancellation is cooperative: the search checks
+a shared counter with its clock and stops, answering with the best move of the last completed iteration.
+'''
+import multiprocessing as mp
+import queue
+import time
+import ChessAI
+from ChessEngine import GameState, Move
+
+
+def _worker_loop(requests: mp.Queue, responses: mp.Queue, cancelled_id, tt_size_mb: float) -> None:
+    '''Worker process main loop: search requests until None is received'''
+
+    searcher = ChessAI.Searcher(tt_size_mb=tt_size_mb)
+    request_id = 0
+    searcher.stop = lambda: cancelled_id.value >= request_id # requests up to cancelled_id are cancelled
+
+    while True:
+        request = requests.get()
+        if request is None:
+            break
+        request_id = request['id']
+        if cancelled_id.value >= request_id: # cancelled before it was picked up
+            continue
+        if request.get('new_game'):
+            searcher.new_game()
+
+        gs = GameState.from_moves(request['fen'], request['moves'])
+        valid_moves = gs.get_valid_moves()
+        start_time = time.perf_counter()
+        move = None
+        score = 0
+        stats = None
+        if valid_moves:
+            move, stats = searcher.find_best_move(searcher.find_move_iterative_deepening, with_stats=True, gs=gs, valid_moves=valid_moves,
+                                                  depth=request.get('depth', ChessAI.MAX_DEPTH), time_limit=request.get('time_limit'),
+                                                  node_limit=request.get('node_limit'))
+            score = searcher.last_score
+        responses.put({'id': request_id,
+                       'move': move.get_uci_notation() if move is not None else None,
+                       'score': score,
+                       'pv': [pv_move.get_uci_notation() for pv_move in searcher.principal_variation] if valid_moves else [],
+                       'nodes': searcher.counter,
+                       'time': time.perf_counter() - start_time,
+                       'cancelled': cancelled_id.value >= request_id,
+                       'stats': stats.to_dict() if stats is not None else None})
+
+
+class SearchWorker():
+    '''
+    Handle of the search process:
+     - request_search sends a position and limits, returns the request id
+     - poll returns the response of the latest request once it's ready (responses to older requests are dropped)
+     - cancel stops the running search cooperatively, the process and its tables stay alive
+    '''
+
+    def __init__(self, tt_size_mb: float = ChessAI.TT_SIZE_MB):
+        self.tt_size_mb = tt_size_mb
+        self.process = None
+        self.request_id = 0 # id of the latest request
+        self.new_game = True
+
+    def start(self) -> None:
+        '''Start the worker process'''
+
+        if self.process is not None and self.process.is_alive():
+            return
+        self.requests = mp.Queue()
+        self.responses = mp.Queue()
+        self.cancelled_id = mp.Value('q', 0, lock=False) # highest cancelled request id
+        self.process = mp.Process(target=_worker_loop, args=(self.requests, self.responses, self.cancelled_id, self.tt_size_mb), daemon=True)
+        self.process.start()
+
+    def stop(self) -> None:
+        '''Cancel running search and shut the worker down'''
+
+        if self.process is None:
+            return
+        self.cancel()
+        self.requests.put(None)
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process = None
+
+    def request_search(self, gs: GameState, depth: int = ChessAI.MAX_DEPTH, time_limit: float = None, node_limit: int = None) -> int:
+        '''Ask for the best move in the position, returns request id (responses carry it)'''
+
+        self.start()
+        self.request_id += 1
+        self.requests.put({'id': self.request_id,
+                           'fen': gs.start_fen,
+                           'moves': [move.get_uci_notation() for move in gs.move_log],
+                           'depth': depth,
+                           'time_limit': time_limit,
+                           'node_limit': node_limit,
+                           'new_game': self.new_game})
+        self.new_game = False
+        return self.request_id
+
+    def cancel(self) -> None:
+        '''Stop the running request (if any), its response is dropped'''
+
+        if self.process is not None:
+            self.cancelled_id.value = self.request_id
+
+    def start_new_game(self) -> None:
+        '''Cancel search and forget tables with the next request'''
+
+        self.cancel()
+        self.new_game = True
+
+    def poll(self):
+        '''Response to the latest request if it's ready, otherwise None'''
+
+        while True:
+            try:
+                response = self.responses.get_nowait()
+            except queue.Empty:
+                return None
+            if response['id'] == self.request_id and not response['cancelled']:
+                return response
+
+    def search(self, gs: GameState, depth: int = ChessAI.MAX_DEPTH, time_limit: float = None, node_limit: int = None) -> dict:
+        '''Blocking request, waits for the response'''
+
+        request_id = self.request_search(gs, depth, time_limit, node_limit)
+        while True:
+            response = self.responses.get()
+            if response['id'] == request_id:
+                return response
+
+    @staticmethod
+    def get_move(gs: GameState, response: dict) -> Move:
+        '''Move object of the response for the position it was requested for'''
+
+        return gs.get_move_from_uci(response['move'])
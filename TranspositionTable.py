@@ -0,0 +1,117 @@
+'''
+Fixed-size transposition table for the negamax search, keyed by GameState Zobrist key.
+'''
+from array import array
+
+# bound types of stored scores
+EXACT = 0
+LOWER_BOUND = 1 # search failed high, real score is >= stored score
+UPPER_BOUND = 2 # search failed low, real score is <= stored score
+
+
+class TranspositionTable():
+    '''
+    Table of already searched positions:
+     - memory is allocated once based on the budget in MB and never grows
+     - every bucket holds 2 entries: depth-preferred and always-replace
+     - entries store key, depth, score, bound type, best move (Move.code, 15 bits) and search generation
+     - counts probes, hits, stores and collisions
+    '''
+
+    ENTRY_BYTES = 8 + 1 + 1 + 1 + 4 + 2 # key, depth, bound, generation, score, move
+
+    def __init__(self, size_mb: float = 16):
+        self.size_mb = size_mb
+        entries = max(2, int(size_mb * 1024 * 1024) // self.ENTRY_BYTES)
+        buckets = 1 << ((entries // 2).bit_length() - 1) # round down to a power of 2 so index is a bit mask
+        self.mask = buckets - 1
+        self.entries = buckets * 2 # slot 2i is depth-preferred, slot 2i + 1 is always-replace
+        # repeating a one item array fills memory directly, no zeroed bytes object is built and copied first
+        self.keys = array('Q', [0]) * self.entries
+        self.depths = array('b', [0]) * self.entries
+        self.bounds = array('B', [0]) * self.entries
+        self.generations = array('B', [0]) * self.entries
+        self.scores = array('i', [0]) * self.entries
+        self.moves = array('H', [0]) * self.entries
+        self.generation = 0
+        self.reset_stats()
+
+    def reset_stats(self) -> None:
+        '''Zero hit/store/collision counters'''
+
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.collisions = 0 # probes where bucket was filled by other positions
+        self.overwrites = 0 # stores that replaced another position
+
+    def clear(self) -> None:
+        '''Remove all entries'''
+
+        self.keys = array('Q', [0]) * self.entries
+        self.generation = 0
+
+    def new_search(self) -> None:
+        '''Mark start of a new search, so depth-preferred entries from older searches can be replaced'''
+
+        self.generation = (self.generation + 1) & 0xFF
+
+    def probe(self, key: int):
+        '''Returns (depth, score, bound, move code) stored for the position or None'''
+
+        self.probes += 1
+        i = (key & self.mask) << 1
+        keys = self.keys
+        if keys[i] != key:
+            i += 1
+            if keys[i] != key:
+                if keys[i - 1] or keys[i]:
+                    self.collisions += 1
+                return None
+        self.hits += 1
+        return self.depths[i], self.scores[i], self.bounds[i], self.moves[i]
+
+    def store(self, key: int, depth: int, score: int, bound: int, move_code: int = 0) -> None:
+        '''
+        Save search result for the position:
+         - depth-preferred slot is used if it holds the same position, a shallower or an older search
+         - otherwise the always-replace slot is used
+        '''
+
+        i = (key & self.mask) << 1
+        keys = self.keys
+        if keys[i] != key and depth < self.depths[i] and self.generations[i] == self.generation and keys[i]:
+            i += 1
+        old_key = keys[i]
+        if old_key and old_key != key:
+            self.overwrites += 1
+        elif old_key == key and not move_code:
+            move_code = self.moves[i] # keep the best move of a previous search of this position
+        keys[i] = key
+        self.depths[i] = depth
+        self.scores[i] = score
+        self.bounds[i] = bound
+        self.moves[i] = move_code
+        self.generations[i] = self.generation
+        self.stores += 1
+
+    def get_hashfull(self) -> int:
+        '''Permille of entries filled, sampled from the first 1000 entries'''
+
+        sample = min(1000, self.entries)
+        return sum(1 for i in range(sample) if self.keys[i]) * 1000 // sample
+
+    def get_stats(self) -> dict:
+        '''Counters and rates for the table since last reset'''
+
+        return {'size_mb': self.size_mb,
+                'entries': self.entries,
+                'probes': self.probes,
+                'hits': self.hits,
+                'stores': self.stores,
+                'collisions': self.collisions,
+                'overwrites': self.overwrites,
+                'hit_rate': self.hits / self.probes if self.probes else 0.0,
+                'collision_rate': self.collisions / self.probes if self.probes else 0.0,
+                'overwrite_rate': self.overwrites / self.stores if self.stores else 0.0,
+                'hashfull': self.get_hashfull()}
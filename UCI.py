@@ -0,0 +1,228 @@
+'''
+UCI (Universal Chess Interface) front-end: drives GameState and the ChessAI search over stdin/stdout,
+so the engine can be played in tournament managers and GUIs without pygame.
+
+Supported commands:
+    uci, isready, ucinewgame, quit
+    setoption name Hash value <MB>         transposition table size
+    setoption name Threads value <N>       N > 1 searches root moves on N worker processes (ParallelSearch)
+    position startpos|fen <FEN> [moves <move1> ...]
+    go [depth N] [movetime MS] [wtime MS btime MS winc MS binc MS movestogo N] [nodes N] [infinite]
+    stop
+The search runs in a background thread, so isready and stop are answered while it's running.
+An info line with depth, score, nodes, nps, time and pv is sent after every completed iteration.
+
+Usage:
+    python UCI.py
+'''
+import sys
+import threading
+import ChessAI
+from ChessEngine import GameState, START_FEN
+
+ENGINE_NAME = 'Chess'
+ENGINE_AUTHOR = 'Heliosphan1'
+MAX_HASH_MB = 1024
+MAX_THREADS = 64
+MOVES_TO_GO = 30 # moves the remaining clock time is split over when the GUI doesn't say
+MOVE_OVERHEAD = 0.05 # seconds kept back for communication with the GUI
+
+
+class UCIEngine():
+    '''
+    State of one UCI session:
+     - position is rebuilt from start FEN plus moves for every position command
+     - one search thread at a time, stop sets an event the search checks together with its clock
+     - all output goes through send, which is safe to call from the search thread
+    '''
+
+    def __init__(self, output = sys.stdout):
+        self.output = output
+        self.output_lock = threading.Lock()
+        self.gs = GameState()
+        self.hash_mb = ChessAI.TT_SIZE_MB
+        self.searcher = ChessAI.Searcher(tt_size_mb=self.hash_mb)
+        self.threads = 1
+        self.search_thread = None
+        self.stop_event = threading.Event()
+        self.running = True
+
+    def send(self, line: str) -> None:
+        '''Write one line to the GUI'''
+
+        with self.output_lock:
+            self.output.write(line + '\n')
+            self.output.flush()
+
+    def run(self, input = sys.stdin) -> None:
+        '''Read commands until quit or end of input'''
+
+        for line in input:
+            self.handle(line)
+            if not self.running:
+                break
+        self.stop()
+
+    def handle(self, line: str) -> None:
+        '''Run one command line, unknown commands are ignored as the protocol asks'''
+
+        fields = line.split()
+        if not fields:
+            return
+        command, args = fields[0], fields[1:]
+        if command == 'uci':
+            self.send(f'id name {ENGINE_NAME}')
+            self.send(f'id author {ENGINE_AUTHOR}')
+            self.send(f'option name Hash type spin default {ChessAI.TT_SIZE_MB} min 1 max {MAX_HASH_MB}')
+            self.send(f'option name Threads type spin default 1 min 1 max {MAX_THREADS}')
+            self.send('uciok')
+        elif command == 'isready':
+            self.send('readyok')
+        elif command == 'ucinewgame':
+            self.stop()
+            self.searcher.new_game()
+        elif command == 'setoption':
+            self.stop()
+            self.set_option(args)
+        elif command == 'position':
+            self.stop()
+            try:
+                self.set_position(args)
+            except ValueError as error:
+                self.send(f'info string invalid position: {error}')
+        elif command == 'go':
+            self.stop()
+            self.go(args)
+        elif command == 'stop':
+            self.stop()
+        elif command == 'quit':
+            self.stop()
+            self.running = False
+
+    def set_option(self, args: list[str]) -> None:
+        '''setoption name <name> value <value>'''
+
+        if 'name' not in args or 'value' not in args:
+            return
+        name = ' '.join(args[args.index('name') + 1:args.index('value')]).lower()
+        value = ' '.join(args[args.index('value') + 1:])
+        try:
+            if name == 'hash':
+                self.hash_mb = min(max(int(value), 1), MAX_HASH_MB)
+                self.searcher = ChessAI.Searcher(tt_size_mb=self.hash_mb)
+            elif name == 'threads':
+                self.threads = min(max(int(value), 1), MAX_THREADS)
+        except ValueError:
+            self.send(f'info string invalid value for {name}: {value}')
+        if self.threads > 1:
+            # workers are forked here, from the main thread: a child forked by the search thread while this one
+            # is blocked reading stdin would hang closing its copy of stdin
+            import ParallelSearch
+            ParallelSearch.get_pool(self.threads, self.hash_mb)
+
+    def set_position(self, args: list[str]) -> None:
+        '''position startpos|fen <FEN> [moves ...], raises ValueError for invalid FENs or moves'''
+
+        end = args.index('moves') if 'moves' in args else len(args)
+        if args and args[0] == 'startpos':
+            fen = START_FEN
+        elif args and args[0] == 'fen':
+            fen = ' '.join(args[1:end])
+        else:
+            raise ValueError('expected startpos or fen')
+        self.gs = GameState.from_moves(fen, args[end + 1:])
+
+    def get_limits(self, args: list[str]) -> tuple:
+        '''(depth, time limit in seconds, node limit, infinite) of go arguments'''
+
+        values = {}
+        for name, value in zip(args, args[1:]):
+            if name in ('depth', 'movetime', 'wtime', 'btime', 'winc', 'binc', 'movestogo', 'nodes'):
+                try:
+                    values[name] = int(value)
+                except ValueError:
+                    pass
+        infinite = 'infinite' in args
+        depth = values.get('depth', ChessAI.MAX_DEPTH)
+        node_limit = values.get('nodes')
+        time_limit = None
+        if 'movetime' in values:
+            time_limit = max(values['movetime'] / 1000 - MOVE_OVERHEAD, 0.01)
+        elif ('wtime' if self.gs.white_to_move else 'btime') in values:
+            remaining = values['wtime' if self.gs.white_to_move else 'btime'] / 1000
+            increment = values.get('winc' if self.gs.white_to_move else 'binc', 0) / 1000
+            budget = remaining / max(values.get('movestogo', MOVES_TO_GO), 1) + 0.8 * increment
+            time_limit = max(min(budget, remaining - MOVE_OVERHEAD), 0.01)
+        if infinite:
+            time_limit = node_limit = None
+            depth = ChessAI.MAX_DEPTH
+        return depth, time_limit, node_limit, infinite
+
+    def go(self, args: list[str]) -> None:
+        '''Start searching the current position in the background'''
+
+        self.stop_event.clear()
+        if self.threads > 1:
+            import ParallelSearch
+            ParallelSearch.clear_stop() # here and not in the search thread, so a stop sent right after go is not lost
+        self.search_thread = threading.Thread(target=self.search, args=self.get_limits(args), daemon=True)
+        self.search_thread.start()
+
+    def search(self, depth: int, time_limit: float, node_limit: int, infinite: bool) -> None:
+        '''Search thread: iterative deepening with info lines, ends with bestmove'''
+
+        gs = self.gs
+        best_move = None
+        try:
+            valid_moves = gs.get_valid_moves()
+            if valid_moves:
+                best_move = valid_moves[0] # played if the search fails
+                if self.threads > 1:
+                    import ParallelSearch # worker processes only when asked for, the pool is started by set_option
+                    _, best_moves = ParallelSearch.find_move_parallel(gs, valid_moves, depth, time_limit, node_limit, self.threads,
+                                                                      self.hash_mb, self.send_info)
+                else:
+                    searcher = self.searcher
+                    searcher.stop = self.stop_event.is_set
+                    searcher.new_search()
+                    searcher.find_move_iterative_deepening(gs, valid_moves, depth, time_limit, node_limit, self.send_info)
+                    best_moves = searcher.best_moves
+                if best_moves:
+                    best_move = best_moves[0]
+        finally: # the GUI waits for bestmove, it is sent even if the search failed
+            if infinite:
+                self.stop_event.wait() # bestmove only after stop, even if the search ended early
+            self.send(f'bestmove {best_move.get_uci_notation() if best_move is not None else "0000"}')
+
+    def send_info(self, depth: int, score: int, nodes: int, seconds: float, pv: list) -> None:
+        '''Info line of a completed iteration'''
+
+        mate_moves = ChessAI.get_mate_moves(score)
+        if mate_moves is not None:
+            score_text = f'mate {mate_moves}'
+        else:
+            score_text = f'cp {score}'
+        nps = int(nodes / seconds) if seconds else 0
+        self.send(f'info depth {depth} score {score_text} nodes {nodes} nps {nps} time {int(seconds * 1000)} '
+                  f'pv {" ".join(move.get_uci_notation() for move in pv)}')
+
+    def stop(self) -> None:
+        '''Stop the running search (if any) and wait until it has sent bestmove'''
+
+        if self.search_thread is None:
+            return
+        self.stop_event.set()
+        if self.threads > 1:
+            import ParallelSearch
+            ParallelSearch.stop_search()
+        self.search_thread.join()
+        self.search_thread = None
+
+
+if __name__ == '__main__':
+    engine = UCIEngine()
+    try:
+        engine.run()
+    finally:
+        if 'ParallelSearch' in sys.modules:
+            sys.modules['ParallelSearch'].close_pool()
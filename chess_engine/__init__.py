@@ -0,0 +1,36 @@
+'''
+Headless engine package: the move generator and search without pygame, for scripts and worker processes.
+
+Names are re-exported lazily, so importing the package (or running `python -m chess_engine perft`)
+only loads the modules that are actually used.
+'''
+import os
+import sys
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _ROOT not in sys.path: # engine modules live next to the package, so it also works from other directories
+    sys.path.insert(0, _ROOT)
+
+# public name -> module it comes from
+_EXPORTS = {
+    'GameState': 'ChessEngine',
+    'Move': 'ChessEngine',
+    'START_FEN': 'ChessEngine',
+    'read_fen_file': 'ChessEngine',
+    'Searcher': 'ChessAI',
+    'get_shared_table': 'ChessAI',
+    'TranspositionTable': 'TranspositionTable',
+    'perft': 'Perft',
+    'UCIEngine': 'UCI',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    module = __import__(_EXPORTS[name])
+    value = getattr(module, name)
+    globals()[name] = value # later lookups skip __getattr__
+    return value
@@ -0,0 +1,22 @@
+'''
+Headless entry point, loads only the engine and search modules (no pygame, display, images or sounds).
+Every command runs the command line of its module, so options are the same as running the module directly.
+
+Usage:
+    python -m chess_engine                          # UCI engine on stdin/stdout (UCI.py)
+    python -m chess_engine perft --depth 4          # perft reference suite (Perft.py)
+    python -m chess_engine bench --runs 20          # cold start benchmark (chess_engine/startup.py)
+'''
+import runpy
+import sys
+
+COMMANDS = {'uci': 'UCI', 'perft': 'Perft', 'bench': 'chess_engine.startup'}
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else 'uci'
+    if command not in COMMANDS:
+        print(__doc__, file=sys.stderr)
+        raise SystemExit(f'unknown command {command!r}, expected one of {", ".join(COMMANDS)}')
+    sys.argv = [f'python -m chess_engine {command}'] + sys.argv[2:]
+    runpy.run_module(COMMANDS[command], run_name='__main__', alter_sys=True)
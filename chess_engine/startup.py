@@ -0,0 +1,51 @@
+'''
+Cold start benchmark: how long a new engine process takes until it can answer, compared with a bare interpreter.
+Every measurement starts fresh processes, so nothing is shared between runs except the OS file cache.
+
+Usage:
+    python -m chess_engine bench --runs 20
+'''
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# (name, interpreter arguments, stdin)
+STARTUP_CASES = [
+    ('python', ['-c', 'pass'], None),
+    ('import ChessEngine', ['-c', 'import ChessEngine'], None),
+    ('import ChessAI', ['-c', 'import ChessAI'], None),
+    ('uci handshake', ['-m', 'chess_engine'], b'uci\nisready\nquit\n'),
+    ('first move (go depth 1)', ['-m', 'chess_engine'], b'position startpos\ngo depth 1\nquit\n'),
+]
+
+
+def time_process(args: list[str], stdin: bytes = None) -> float:
+    '''Seconds from starting the interpreter with args until it exits'''
+
+    start_time = time.perf_counter()
+    subprocess.run([sys.executable] + args, input=stdin, stdout=subprocess.DEVNULL, cwd=_ROOT, check=True)
+    return time.perf_counter() - start_time
+
+def startup_benchmark(runs: int = 20) -> dict[str, dict]:
+    '''Start every case runs times, print and return min/median milliseconds per case'''
+
+    results = {}
+    for name, args, stdin in STARTUP_CASES:
+        times = [time_process(args, stdin) * 1000 for _ in range(runs)]
+        results[name] = {'min': min(times), 'median': statistics.median(times)}
+    baseline = results['python']['min']
+    for name, result in results.items():
+        print(f'{name:<26} min {result["min"]:7.1f}ms  median {result["median"]:7.1f}ms  over python {result["min"] - baseline:6.1f}ms')
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Cold start time of engine processes')
+    parser.add_argument('--runs', type=int, default=20, help='processes started per case')
+    args = parser.parse_args()
+    startup_benchmark(args.runs)
@@ -2,9 +2,9 @@ import pygame
 import io
 from ChessEngine import GameState, Move
 import ChessAI
+from SearchWorker import SearchWorker
 import time
 import os
-import multiprocessing as mp
 # import PIL
 # import pygame.freetype    
 
@@ -90,12 +90,12 @@ def draw_board(screen: pygame.display):
         letter_label = LABEL_FONT.render(ch, True, letter_color)
         screen.blit(letter_label, ((i+1) * SQ_SIZE - letter_label.get_width() - 2, screen.get_height() - letter_label.get_height() - 2))
 
-def draw_pieces(gs: GameState, screen: pygame.display):
-    '''Displays chess pieces based on gamestate'''
+def draw_pieces(gs: GameState, screen: pygame.display, hidden_square: tuple[int, int] = None):
+    '''Displays chess pieces based on gamestate, except the piece on hidden_square'''
     
     for i, row in enumerate(gs.board):
         for j, cell in enumerate(row):      
-            if cell != '--':
+            if cell != '--' and (i, j) != hidden_square:
                 piece = IMAGES[cell]
                 screen.blit(piece, (j * SQ_SIZE, i * SQ_SIZE))
  
@@ -145,7 +145,7 @@ def draw_moving_state(gs: GameState, screen: pygame.display, valid_moves: list[M
     screen.blit(transp_img, (c * SQ_SIZE, r * SQ_SIZE))
     
     # highglight if in check
-    draw_check(gs, screen, 'w' if gs.white_to_move else 'b')
+    draw_check(gs, screen)
     
     # draw moving piece on top of mouse    
     piece_img = IMAGES[piece]
@@ -173,11 +173,12 @@ def get_promotion_squares(square: tuple[int, int]) -> dict:
     promotion_sqs = {(square[0] + direction * i, square[1]): color + promotion_pieces[i] for i in range(4)}
     return promotion_sqs   
  
-def draw_promotion(gs: GameState, screen: pygame.display, square: tuple[int, int]):
+def draw_promotion(gs: GameState, screen: pygame.display, move: Move):
     '''Displays special promotion screen when pawn reaches edge rank with options to promote to (Queen, Knight, Rook, Bishop) for user to click'''
     
+    square = move.end_sq
     draw_board(screen)
-    draw_pieces(gs, screen)
+    draw_pieces(gs, screen, move.start_sq) # the pawn is drawn as already gone, the move is only made once a piece is chosen
     draw_movelog(gs, screen)
     # draw opaque square on top of the screen during promotion for highlighting
     s = pygame.Surface(BOARD_SIZE)
@@ -252,16 +253,11 @@ def draw_triangles(screen: pygame.display, color: tuple[int, int, int], square:
         v3 = (v1[0], v1[1] + t[3] * SQ_SIZE * scale)
         pygame.draw.polygon(screen, color, (v1, v2, v3))
 
-def draw_check(gs: GameState, screen: pygame.display, player_color: str):
-    '''Highlight king square if king is in check'''
+def draw_check(gs: GameState, screen: pygame.display):
+    '''Highlight king square of the side to move if it's in check'''
     
     if gs.in_check():
-        for i in range(len(gs.board)):
-            for j in range(len(gs.board[0])):
-                if gs.board[i][j] == player_color + 'K':
-                    r, c = i, j
-                    break
-        draw_triangles(screen, CHECK_COLOR, (r, c), 0.2)     
+        draw_triangles(screen, CHECK_COLOR, gs.get_king_square(), 0.2)
 
 def animate_move(gs: GameState, screen: pygame.display, move: Move, clock: pygame.time.Clock):
     '''Animate the last played move'''
@@ -353,6 +349,8 @@ def main():
     player_one = True # True if human is playing white, False if AI is playing white
     player_two = False # True if human is playing Black, False if AI is playing Black
     ai_thinking = False
+    ai_worker = SearchWorker() # search process lives for the whole session, its tables carry over between moves
+    ai_worker.start()
     
     while run:
         human_turn = (curr_state.white_to_move and player_one) or (not curr_state.white_to_move and player_two)
@@ -386,14 +384,13 @@ def main():
                                 # to allow piece highlighting while AI is thinking
                                     move_played = Move(clicked_sqs[0], clicked_sqs[1], curr_state) # register the move
                                     for i in range(len(valid_moves)):
-                                        if move_played == valid_moves[i]: # testing if move is valid
+                                        if (move_played.start_sq, move_played.end_sq) == (valid_moves[i].start_sq, valid_moves[i].end_sq): # testing if move is valid, the promotion piece is picked later
                                             update_move(move_played, valid_moves[i])
                                             if move_played.is_promotion:
                                                 promotion = True # move to promotion branch
                                                 animate_move(curr_state, screen, move_played, clock)
                                                 play_sound(move_played)
                                                 promotion_sqs = get_promotion_squares(move_played.end_sq) # generate squares and pieces for promotion screen
-                                                curr_state.remove_piece(move_played.start_sq) # remove pawn for promotion screen (for visual purposes)
                                             else:
                                                 curr_state.make_move(move_played)
                                                 animate_move(curr_state, screen, move_played, clock)
@@ -430,12 +427,11 @@ def main():
                             clicked_sqs.append(lmb_up_pos) # add target square
                             move_played = Move(clicked_sqs[0], clicked_sqs[1], curr_state) # register the move
                             for i in range(len(valid_moves)):
-                                if move_played == valid_moves[i]: # testing if move is valid
+                                if (move_played.start_sq, move_played.end_sq) == (valid_moves[i].start_sq, valid_moves[i].end_sq): # testing if move is valid, the promotion piece is picked later
                                     update_move(move_played, valid_moves[i])
                                     if move_played.is_promotion:
                                         promotion = True # move to promotion branch
                                         promotion_sqs = get_promotion_squares(move_played.end_sq) # generate squares and pieces for promotion screen
-                                        curr_state.remove_piece(move_played.start_sq) # remove pawn for promotion screen (for visual purposes)
                                         play_sound(move_played)
                                     else:
                                         curr_state.make_move(move_played)
@@ -451,7 +447,7 @@ def main():
                 elif event.type == pygame.KEYUP and not is_lmb_pressed:
                     if event.key == pygame.K_LEFT:
                         if ai_thinking:
-                            mp.active_children()[0].terminate() # kill the running process
+                            ai_worker.cancel() # stop the running search
                             ai_thinking = False
                         clicked_sqs.clear()
                         curr_state.undo_last_move()
@@ -467,8 +463,8 @@ def main():
                     if event.key == pygame.K_r:
                         # completely reset the game
                         if ai_thinking:
-                            mp.active_children()[0].terminate() # kill the running process
                             ai_thinking = False
+                        ai_worker.start_new_game() # stop the running search and clear tables
                         curr_state = GameState()
                         valid_moves = curr_state.get_valid_moves()
                         move_made = False
@@ -490,7 +486,6 @@ def main():
                         clicked_sqs.append(get_square(event.pos)) # remember square where button is released
                         if clicked_sqs[1] not in promotion_sqs: # if we don't release in promotion area, revert to move before promoting
                             promotion = False
-                            curr_state.add_piece(move_played.start_sq, move_played.piece_moved)
                         elif clicked_sqs[0] == clicked_sqs[1]: # if clicked and released on the same square - choose that piece
                             move_played.promotion_piece = promotion_sqs[clicked_sqs[0]] # assign chosen piece to promote to
                             curr_state.make_move(move_played)
@@ -503,7 +498,7 @@ def main():
         
         is_lmb_pressed = pygame.mouse.get_pressed()[0]
         if promotion:
-            draw_promotion(curr_state, screen, move_played.end_sq)       
+            draw_promotion(curr_state, screen, move_played)       
         elif  is_lmb_pressed and not promotion and clicked_sqs: # if mouse is moved with LMB pressed and piece selected, display moving animation, else draw static board
             draw_moving_state(curr_state, screen, valid_moves, clicked_sqs[0])
         else:
@@ -514,25 +509,19 @@ def main():
                 highlight_start_sq(screen, clicked_sqs[0])
                 highlight_moves(curr_state, screen, valid_moves, clicked_sqs[0])
             draw_pieces(curr_state, screen)
-            draw_check(curr_state, screen, player_color)
+            draw_check(curr_state, screen)
         
         # AI moves
         if not game_over and not human_turn:
             if not ai_thinking:
                 ai_thinking = True
-                return_queue = mp.Queue()
-                ai_process = mp.Process(
-                    target=ChessAI.find_best_move,
-                    args=(ChessAI.find_move_negamax_ab_pruning, return_queue),
-                    kwargs={'gs': curr_state, 'valid_moves': valid_moves, 'depth': ChessAI.DEPTH})
-                ai_process.start() # start find_move function
-                # move_played = ChessAI.find_best_move(ChessAI.find_move_negamax_ab_pruning, gs=curr_state, valid_moves=valid_moves, depth=ChessAI.DEPTH)
-            if not ai_process.is_alive():
-                move_played = return_queue.get()
-                if move_played is None:
-                    move_played = ChessAI.find_random_move(valid_moves)
-                if move_played.is_promotion:
-                    move_played.promotion_piece = player_color + 'Q'
+                ai_worker.request_search(curr_state, depth=ChessAI.MAX_DEPTH, time_limit=ChessAI.TIME_LIMIT)
+            response = ai_worker.poll()
+            if response is not None:
+                if response['move'] is None:
+                    move_played = ChessAI.find_random_move(curr_state, valid_moves)
+                else:
+                    move_played = SearchWorker.get_move(curr_state, response)
                 curr_state.make_move(move_played)
                 animate_move(curr_state, screen, move_played, clock)
                 play_sound(move_played)
@@ -544,9 +533,9 @@ def main():
             move_made = False
             player_color = 'w' if curr_state.white_to_move else 'b'
             valid_moves = curr_state.get_valid_moves()
-            if curr_state.checkmate or curr_state.stalemate: # update check, checkmate and stalemate attributes
+            if curr_state.checkmate or curr_state.draw_reason is not None: # update check, checkmate and draw attributes
                 move_played.is_checkmate = curr_state.checkmate
-                move_played.is_stalemate = curr_state.stalemate
+                move_played.is_stalemate = curr_state.draw_reason is not None
                 game_over = True
             elif curr_state.in_check():
                 move_played.is_check = True
@@ -558,11 +547,13 @@ def main():
                     draw_end_text(screen, 'Black won')
                 else:
                     draw_end_text(screen, 'White won')
-            elif curr_state.stalemate:
-                draw_end_text(screen, 'Draw')
+            elif curr_state.draw_reason is not None:
+                draw_end_text(screen, f'Draw by {curr_state.draw_reason}')
                     
         clock.tick(FPS)
         pygame.display.flip()
+    
+    ai_worker.stop()
    
         
         